@@ -1,43 +1,91 @@
 import random
-from ..tools.chat import chat
+from ..tools.router import ModelRouter
 from ..journal.journals import Journal
 from ..journal.nodes import Node
-from ..tools.text_processing import *
-from ..tools.data_helper import *
-from ..tools.interpreter import *
+from ..journal.artifacts import ArtifactStore
+from ..tools.text_processing import (
+    extract_code,
+    extract_json,
+    extract_text_up_to_code,
+    wrap_code,
+)
+from ..tools.data_helper import data_preview_generate
+from ..tools.interpreter import ExecutionResult, children_cpu_time
+from ..tools.resources import ResourceProfile
+from ..tools.tracing import tracer
+from ..tools.predictions import PREDICTION_FILES
+from ..tools.sweep import TUNE_MARKER, find_tunables, make_variants, run_sweep
+from .budget import SearchBudget
+from .context import ContextBuilder
+from pathlib import Path
 from typing import Callable
 
 
-DEFAULT_MODEL = "glm-4-flash-250414"
-model = "llama3.1:8b-instruct-q8_0"
+ExecCallbackType = Callable[..., ExecutionResult]
 
-ExecCallbackType = Callable[[str, bool], ExecutionResult]
+# Files written by the generated code into the working directory, collected per node.
+OUTPUT_FILES = ("submission.csv", *PREDICTION_FILES)
+
+PREDICTIONS_INSTRUCTION = (
+    "Always use the same validation set, so that the predictions of different solutions can be ensembled: "
+    "split the training data as loaded (before dropping or reordering any rows) with "
+    "sklearn.model_selection.train_test_split(train_df, test_size=0.2, random_state=42). "
+    "After training, call the predefined function save_predictions(val_pred, val_target, test_pred) "
+    "with the predictions on the validation set, the validation targets and the predictions on the testing set."
+)
+
+STAGE_INSTRUCTION = (
+    'Split the code into stages with "# %% <stage name>" marker lines, for example "# %% load data", '
+    '"# %% feature engineering" and "# %% train and evaluate". '
+    "Keep the stages you do not need to change exactly as they are."
+)
+
+TUNE_INSTRUCTION = (
+    f'Write numeric hyperparameters worth tuning as literals and end their lines with a "{TUNE_MARKER}" comment, '
+    f'for example "learning_rate = 0.05  {TUNE_MARKER}".'
+)
 
 
 class Agent:
-    def __init__(self, cfg, journal: Journal):
+    def __init__(
+        self,
+        cfg,
+        journal: Journal,
+        budget: SearchBudget | None = None,
+        artifacts: ArtifactStore | None = None,
+        resources: ResourceProfile | None = None,
+    ):
         super().__init__()
         self.cfg = cfg
         self.journal = journal
+        self.budget = budget
+        self.artifacts = artifacts
+        self.resources = resources
+        self.swept_node_ids: set[str] = set()
+        self.context = ContextBuilder.from_config(cfg.agent.context)
+        self.router = ModelRouter.from_config(cfg.models)
         self.data_preview: str | None = None
 
     def plan_and_code_query(
-        self, system_message, user_message, model=DEFAULT_MODEL, retries=3
+        self, system_message, user_message, role="code", retries=3
     ) -> tuple[str, str]:
         """Generate a natural language plan + code in the same LLM call and split them apart."""
 
         response = None
-        for _ in range(retries):
+        for attempt in range(retries):
+            if attempt:
+                tracer.incr("llm_retries")
 
-            response = chat(
-                _model=model,
-                _messages=[
+            response = self.router.chat(
+                role,
+                [
                     {"role": "system", "content": system_message},
                     {"role": "user", "content": user_message},
                 ],
             )
-            code = extract_code(response)
-            plan = extract_text_up_to_code(response)
+            with tracer.span("code_extraction"):
+                code = extract_code(response)
+                plan = extract_text_up_to_code(response)
 
             if code:
                 return plan, code
@@ -53,71 +101,135 @@ class Agent:
 
         # ================ TODO: ask LLM agents to come up with a solution and then implement ================
 
-        system_promt = "You are an AI agent."
-
-        user_prompt = [
-            "You have to come up with a solution for machine learning task and then implement this solution in Python.",
-            f"The task is to {str(self.cfg.task_goal)} ",
-            f'All the provided input data is stored in "{self.cfg.data_dir}" directory.',
-            f"{str(self.data_preview)}",
-            'You have to save the predictions result on testing set in "/data/submission.csv".',
-            "Note that the testing file DOES NOT have the target column.",
-            "You should only return the whole analysis and final code.",
-        ]
-        system_message = system_promt
-        user_message = "\n".join(user_prompt)
+        with tracer.span("prompt_build", stage="draft"):
+            system_promt = "You are an AI agent."
+
+            user_prompt = [
+                "You have to come up with a solution for machine learning task and then implement this solution in Python.",
+                f"The task is to {str(self.cfg.task_goal)} ",
+                f'All the provided input data is stored in "{self.cfg.data_dir}" directory.',
+                self.context.data_preview(self.data_preview),
+                'You have to save the predictions result on testing set in "submission.csv" in the current working directory.',
+                "Note that the testing file DOES NOT have the target column.",
+                PREDICTIONS_INSTRUCTION,
+                *self.stage_instructions(),
+                "You should only return the whole analysis and final code.",
+            ]
+            system_message = system_promt
+            user_message = "\n".join(user_prompt)
         plan, code = self.plan_and_code_query(
             system_message=system_message,
             user_message=user_message,
-            model=model,
         )
         return Node(plan=plan, code=code)
 
     def do_improve(self, parent: Node) -> Node:
 
         # ================= TODO: ask LLM agent to improve the draft ==================
-        system_prompt = "You are an AI assistant. Please improve the following task-code to better overcome the task:"
-
-        user_prompt = [
-            f"Task description: {str(self.cfg.task_goal)} ",
-            f"Memory: {str(self.journal.generate_summary())} ",
-            f"Previous solution: Code: {str(wrap_code(parent.code))} ",
-            "You should only return the whole analysis and final code.",
-        ]
-        system_message = system_prompt
-        user_message = " ".join(user_prompt)
+        with tracer.span("prompt_build", stage="improve"):
+            system_prompt = "You are an AI assistant. Please improve the following task-code to better overcome the task:"
+
+            user_prompt = [
+                f"Task description: {str(self.cfg.task_goal)} ",
+                f"Memory: {self.context.memory(self.journal)} ",
+                f"Previous solution: Code: {str(wrap_code(parent.code))} ",
+                PREDICTIONS_INSTRUCTION,
+                *self.stage_instructions(),
+                "You should only return the whole analysis and final code.",
+            ]
+            system_message = system_prompt
+            user_message = " ".join(user_prompt)
         plan, code = self.plan_and_code_query(
             system_message=system_message,
             user_message=user_message,
-            model=model,
         )
         return Node(plan=plan, code=code, parent=parent)
 
     def do_debug(self, parent: Node) -> Node:
 
         # ================ TODO: ask LLM agent to debug ====================
-        system_prompt = "You are an LLM agent. Please debug the following task-code to better overcome the task:"
-
-        user_prompt = [
-            f"Task description: {str(self.cfg.task_goal)}",
-            f"Previous (buggy) implementation: {str(wrap_code(parent.code))}",
-            f"Execution output: {str(wrap_code(parent.term_out, lang=''))}",
-            f"The revelant data:\n {str(self.data_preview)}",
-            "You should only return the whole analysis and final code.",
-        ]
+        with tracer.span("prompt_build", stage="debug"):
+            system_prompt = "You are an LLM agent. Please debug the following task-code to better overcome the task:"
+
+            user_prompt = [
+                f"Task description: {str(self.cfg.task_goal)}",
+                f"The revelant data:\n {self.context.data_preview(self.data_preview)}",
+                f"Previous (buggy) implementation: {str(wrap_code(parent.code))}",
+                f"Execution output: {str(wrap_code(parent.term_out, lang=''))}",
+                *self.stage_instructions(),
+                "You should only return the whole analysis and final code.",
+            ]
 
-        system_message = system_prompt
-        user_message = "\n\n".join(user_prompt)
+            system_message = system_prompt
+            user_message = "\n\n".join(user_prompt)
 
         plan, code = self.plan_and_code_query(
             system_message=system_message,
             user_message=user_message,
-            model=model,
         )
         return Node(plan=plan, code=code, parent=parent)
 
+    def do_sweep(self, parent: Node) -> Node | None:
+        """Tune the numeric hyperparameters of the parent locally, without asking the LLM per value."""
+        sweep_cfg = self.cfg.agent.sweep
+        self.swept_node_ids.add(parent.id)
+        tunables = find_tunables(parent.code)
+        if not tunables:
+            return None
+
+        timeout = sweep_cfg.timeout
+        if self.budget is not None:
+            remaining = self.budget.remaining
+            if remaining is not None:
+                # keep enough budget to run the best variant again as the new node
+                reserve = self.budget.expected_runtime(parent) or 0.0
+                timeout = min(timeout, max(remaining - reserve, 0.0))
+            if timeout < self.budget.min_timeout:
+                return None
+
+        variants = make_variants(
+            parent.code, tunables, sweep_cfg.num_variants, seed=len(self.journal)
+        )
+        # the variants are reaped before run_sweep returns, so its CPU time shows up in RUSAGE_CHILDREN
+        cpu_start = children_cpu_time()
+        with tracer.span("sweep", node_id=parent.id, variants=len(variants)):
+            results = run_sweep(
+                variants,
+                workers=sweep_cfg.workers,
+                timeout=timeout,
+                work_dir=str(Path(self.cfg.work_dir) / "sweep"),
+                resources=self.resources,
+            )
+        if self.budget is not None:
+            self.budget.charge_cpu(children_cpu_time() - cpu_start)
+        results = [r for r in results if r.exc_type is None and r.metric is not None]
+        if not results:
+            return None
+
+        best = min(results, key=lambda r: r.metric)
+        values = ", ".join(f"{name}={value}" for name, value in best.values.items())
+        plan = (
+            f"Hyperparameter sweep over {len(results)} variants of the previous solution. "
+            f"The best configuration ({values}) reached a validation MSE of {best.metric:.6g}."
+        )
+        return Node(plan=plan, code=best.code, parent=parent)
+
+    def stage_instructions(self) -> list[str]:
+        """
+        Ask for stage markers when code is executed incrementally in warm sessions or swept (the
+        variants share the stages before the first changed one), and for tunable markers when swept.
+        """
+        instructions = []
+        if self.cfg.agent.incremental.enabled or self.cfg.agent.sweep.enabled:
+            instructions.append(STAGE_INSTRUCTION)
+        if self.cfg.agent.sweep.enabled:
+            instructions.append(TUNE_INSTRUCTION)
+        return instructions
+
     def update_data_preview(self):
-        self.data_preview = data_preview_generate(self.cfg.data_dir)
+        self.data_preview = data_preview_generate(
+            self.cfg.data_dir, **vars(self.cfg.agent.data_preview)
+        )
 
     def select_node(self) -> Node:
         """Select a node to work on (None if drafting a new node)."""
@@ -130,46 +242,93 @@ class Agent:
         # randomly debugging
         if random.random() < search_cfg.debug_prob:
             # buggable & leaf nodes
-            debuggable_nodes = [
-                node for node in self.journal.buggy_nodes if node.is_leaf
-            ]
+            debuggable_nodes = self.journal.buggy_leaf_nodes
             if debuggable_nodes:
                 return random.choice(debuggable_nodes)
 
         # improving
-        good_nodes = self.journal.good_nodes
-        if not good_nodes:
-            # there are all buggable nodes, Backing to draft to make a new one.
-            return None
-
         # TODO If the best one now will be the best next?
         best_node = self.journal.best_node
-        return best_node
+        if best_node is None:
+            # there are all buggable nodes, Backing to draft to make a new one.
+            return None
+        if self.fits_budget(best_node):
+            return best_node
+
+        # skip candidates which are expected to run longer than the remaining budget,
+        # looking at more and more of the best nodes instead of loading all good nodes
+        k = 8
+        while True:
+            candidates = self.journal.top_k(k)
+            for node in candidates:
+                if self.fits_budget(node):
+                    return node
+            if len(candidates) < k:
+                return None
+            k *= 2
+
+    def fits_budget(self, node: Node) -> bool:
+        return self.budget is None or self.budget.fits(node)
 
     def step(self, exec_callback: ExecCallbackType):
-        if not self.journal.nodes or not self.data_preview:
-            self.update_data_preview()
-
-        prev_node = self.select_node()
-
-        if prev_node is None:
-            next_node = self.do_draft()
-        elif prev_node.is_buggy:
-            next_node = self.do_debug(parent=prev_node)
-        else:
-            next_node = self.do_improve(parent=prev_node)
-
-        self.parse_exec_result(
-            node=next_node,
-            exec_result=exec_callback(next_node.code, True),
-            model=model,
-        )
-
-        # update the journal
-        self.journal.append(next_node)
+        with tracer.span("step") as span:
+            if not len(self.journal) or not self.data_preview:
+                with tracer.span("data_preview"):
+                    self.update_data_preview()
+
+            prev_node = self.select_node()
+
+            if prev_node is None:
+                next_node = self.do_draft()
+            elif prev_node.is_buggy:
+                next_node = self.do_debug(parent=prev_node)
+            else:
+                next_node = None
+                sweep_cfg = self.cfg.agent.sweep
+                if (
+                    sweep_cfg.enabled
+                    and prev_node.id not in self.swept_node_ids
+                    and random.random() < sweep_cfg.prob
+                ):
+                    next_node = self.do_sweep(parent=prev_node)
+                if next_node is None:
+                    next_node = self.do_improve(parent=prev_node)
+            span.update(node_id=next_node.id, stage=next_node.stage_name)
+
+            timeout = self.budget.node_timeout(prev_node) if self.budget else None
+            # do not let a node pick up the outputs of the previous one
+            for name in OUTPUT_FILES:
+                (Path(self.cfg.work_dir) / name).unlink(missing_ok=True)
+            with tracer.span("exec", node_id=next_node.id, timeout=timeout):
+                if self.cfg.agent.incremental.enabled:
+                    # re-run only the changed stages in the warm session of this lineage
+                    lineage = (
+                        self.journal.tree.root_id(prev_node.id) if prev_node else next_node.id
+                    )
+                    exec_result = exec_callback(
+                        next_node.code, False, timeout=timeout, lineage=lineage
+                    )
+                else:
+                    exec_result = exec_callback(next_node.code, True, timeout=timeout)
+            if self.budget:
+                self.budget.charge(exec_result)
+            with tracer.span("parse_exec_result", node_id=next_node.id):
+                self.parse_exec_result(
+                    node=next_node,
+                    exec_result=exec_result,
+                )
+
+            # update the journal
+            self.journal.append(next_node)
+            if self.artifacts is not None:
+                with tracer.span("save_artifacts", node_id=next_node.id):
+                    self.artifacts.add_node(
+                        next_node,
+                        files={name: Path(self.cfg.work_dir) / name for name in OUTPUT_FILES},
+                    )
 
     def parse_exec_result(
-        self, node: Node, exec_result: ExecutionResult, model=DEFAULT_MODEL
+        self, node: Node, exec_result: ExecutionResult, role="feedback"
     ):
         node.absorb_exec_result(exec_result)
 
@@ -190,9 +349,9 @@ class Agent:
         system_message = system_prompt
         user_message = "\n".join(user_prompt)
 
-        response = chat(
-            _model=model,
-            _messages=[
+        response = self.router.chat(
+            role,
+            [
                 {"role": "system", "content": system_message},
                 {"role": "user", "content": user_message},
             ],
@@ -0,0 +1,89 @@
+import time
+
+from ..journal.nodes import Node
+from ..tools.interpreter import ExecutionResult
+
+
+class SearchBudget:
+    """
+    Wall-clock and CPU-second budget of a search run.
+
+    The per-node timeout is derived from the remaining budget and the parent's exec_time,
+    so a run finishes within its budget instead of after a fixed number of steps.
+    CPU time counts the agent process plus the CPU time reported by the interpreter children.
+    """
+
+    def __init__(
+        self,
+        wall_seconds: float | None = None,
+        cpu_seconds: float | None = None,
+        timeout_slack: float = 3.0,
+        min_timeout: float = 60,
+        max_timeout: float = 3600,
+    ):
+        self.wall_seconds = wall_seconds
+        self.cpu_seconds = cpu_seconds
+        self.timeout_slack = timeout_slack
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+        self.start_wall = time.monotonic()
+        self.start_cpu = time.process_time()
+        self.child_cpu = 0.0
+
+    @classmethod
+    def from_config(cls, budget_cfg) -> "SearchBudget":
+        return cls(**vars(budget_cfg))
+
+    @property
+    def cpu_used(self) -> float:
+        return time.process_time() - self.start_cpu + self.child_cpu
+
+    @property
+    def remaining(self) -> float | None:
+        """Seconds left in the tightest budget (None if the run is not budgeted)."""
+        remaining = []
+        if self.wall_seconds is not None:
+            remaining.append(self.wall_seconds - (time.monotonic() - self.start_wall))
+        if self.cpu_seconds is not None:
+            remaining.append(self.cpu_seconds - self.cpu_used)
+        return min(remaining) if remaining else None
+
+    @property
+    def exhausted(self) -> bool:
+        """Whether there is not enough budget left to run another candidate."""
+        remaining = self.remaining
+        return remaining is not None and remaining < self.min_timeout
+
+    def charge(self, exec_result: ExecutionResult) -> None:
+        """Account for the CPU time spent by the interpreter child."""
+        if exec_result.cpu_time is not None:
+            self.child_cpu += exec_result.cpu_time
+        else:
+            # e.g. the child was killed on timeout, assume it was busy the whole time
+            self.child_cpu += exec_result.exec_time or 0.0
+
+    def charge_cpu(self, seconds: float) -> None:
+        """Account for CPU time spent by other subprocesses (e.g. the workers of a sweep)."""
+        self.child_cpu += seconds
+
+    def expected_runtime(self, parent: Node | None) -> float | None:
+        """Expected runtime of a child of `parent`, only known for parents that ran successfully."""
+        if parent is None or parent.is_buggy or parent.exec_time is None:
+            return None
+        return parent.exec_time
+
+    def fits(self, parent: Node | None) -> bool:
+        """Whether a child of `parent` is expected to finish within the remaining budget."""
+        expected, remaining = self.expected_runtime(parent), self.remaining
+        return expected is None or remaining is None or expected <= remaining
+
+    def node_timeout(self, parent: Node | None) -> float:
+        """Timeout for the next candidate, derived from the parent's runtime and the remaining budget."""
+        timeout = self.max_timeout
+        expected = self.expected_runtime(parent)
+        if expected is not None:
+            timeout = min(timeout, max(self.min_timeout, self.timeout_slack * expected))
+        remaining = self.remaining
+        if remaining is not None:
+            timeout = min(timeout, max(remaining, 0.0))
+        return timeout
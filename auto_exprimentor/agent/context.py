@@ -0,0 +1,66 @@
+from ..journal.nodes import Node
+from ..tools.chat import estimate_tokens
+from ..tools.text_processing import trim_long_string
+from ..tools.tracing import tracer
+
+
+class ContextBuilder:
+    """
+    Builds the memory and data sections of the prompts.
+
+    Each node summary is rendered once and cached. The memory holds the top-k best nodes
+    that fit into a token budget, ordered by step so that the prompt prefix stays stable
+    between calls and the backend can reuse its prefix (KV) cache.
+    """
+
+    def __init__(self, max_tokens: int = 2000, top_k: int = 5, preview_tokens: int = 1000):
+        self.max_tokens = max_tokens
+        self.top_k = top_k
+        self.preview_tokens = preview_tokens
+        self._summaries: dict[str, str] = {}
+        self._preview: tuple[str, str] | None = None
+
+    @classmethod
+    def from_config(cls, context_cfg) -> "ContextBuilder":
+        return cls(**vars(context_cfg))
+
+    def node_summary(self, node: Node) -> str:
+        """Render (and cache) the summary of a single node."""
+        summary = self._summaries.get(node.id)
+        if summary is not None:
+            tracer.incr("context_cache_hits")
+            return summary
+        summary = "\n".join(
+            [
+                f"Design: {node.plan}",
+                f"Result: {node.analysis}",
+                f"Validation Metric (Mean Squared Error): {node.metric}",
+            ]
+        )
+        self._summaries[node.id] = summary
+        return summary
+
+    def memory(self, journal) -> str:
+        """Summaries of the best good nodes which fit into the token budget."""
+        selected, used = [], 0
+        for node in journal.top_k(self.top_k):
+            summary = self.node_summary(node)
+            tokens = estimate_tokens([{"content": summary}])
+            if used + tokens > self.max_tokens:
+                continue
+            selected.append((node.step, summary))
+            used += tokens
+        # keep the order of appearance so that new nodes extend the prompt instead of reshuffling it
+        selected.sort(key=lambda x: x[0])
+        return "\n----------------------------------\n".join(
+            summary for _, summary in selected
+        )
+
+    def data_preview(self, data_preview: str | None) -> str:
+        """The data preview trimmed to its token budget (cached)."""
+        data_preview = str(data_preview)
+        if self._preview is None or self._preview[0] != data_preview:
+            # about 4 characters per token, half of them from the head and half from the tail
+            k = self.preview_tokens * 2
+            self._preview = (data_preview, trim_long_string(data_preview, threshold=2 * k, k=k))
+        return self._preview[1]
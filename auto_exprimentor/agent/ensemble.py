@@ -0,0 +1,137 @@
+from __future__ import annotations
+
+import csv
+import json
+import logging
+
+from ..journal.artifacts import ArtifactStore
+from ..tools.lazy import lazy_import
+from ..tools.predictions import TEST_PRED_FILE, VAL_PRED_FILE, VAL_TARGET_FILE
+
+np = lazy_import("numpy")
+
+
+def load_predictions(artifacts: ArtifactStore, nodes) -> tuple[list, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Stack the cached predictions of the nodes which share the same validation split.
+    Returns (nodes, val_preds (m, n), test_preds (m, t), val_target (n,)).
+    """
+    used, val_preds, test_preds, target = [], [], [], None
+    for node in nodes:
+        paths = [artifacts.path(node.id, name) for name in (VAL_PRED_FILE, VAL_TARGET_FILE, TEST_PRED_FILE)]
+        if not all(path.exists() for path in paths):
+            continue
+        val_pred, val_target, test_pred = (np.load(path) for path in paths)
+        if target is None:
+            target = val_target
+        elif val_target.shape != target.shape or not np.allclose(val_target, target):
+            # a different validation split, the predictions are not comparable
+            continue
+        if test_preds and test_pred.shape != test_preds[0].shape:
+            continue
+        used.append(node)
+        val_preds.append(val_pred)
+        test_preds.append(test_pred)
+    if not used:
+        return [], np.empty((0, 0)), np.empty((0, 0)), np.empty(0)
+    return used, np.stack(val_preds), np.stack(test_preds), target
+
+
+def mse(preds: np.ndarray, target: np.ndarray) -> np.ndarray:
+    """Mean squared error of each row of `preds`."""
+    return np.mean((preds - target) ** 2, axis=-1)
+
+
+def greedy_selection(val_preds: np.ndarray, target: np.ndarray, max_rounds: int = 50) -> np.ndarray:
+    """
+    Greedy forward selection with replacement (Caruana et al.).
+    Every round scores adding each of the m models at once and keeps the best one.
+    Returns the ensemble weights (m,) of the best round.
+    """
+    m, n = val_preds.shape
+    # With residuals R = P - y and e the residual of the current ensemble, adding model i gives
+    # ||((r - 1) e + R_i) / r||^2 = ((r - 1)^2 ||e||^2 + 2 (r - 1) R_i.e + ||R_i||^2) / r^2,
+    # so each round costs a single matrix-vector product.
+    residuals = val_preds - target
+    residual_norms = np.einsum("ij,ij->i", residuals, residuals)
+    counts = np.zeros(m)
+    e = np.zeros(n, dtype=residuals.dtype)
+    best_counts, best_error = counts.copy(), np.inf
+    for r in range(1, max_rounds + 1):
+        errors = ((r - 1) ** 2 * (e @ e) + 2 * (r - 1) * (residuals @ e) + residual_norms) / (r**2 * n)
+        i = int(np.argmin(errors))
+        counts[i] += 1
+        e = ((r - 1) * e + residuals[i]) / r
+        if errors[i] < best_error:
+            best_error, best_counts = errors[i], counts.copy()
+    return best_counts / best_counts.sum()
+
+
+def project_to_simplex(w: np.ndarray) -> np.ndarray:
+    """Euclidean projection onto {w >= 0, sum(w) = 1}."""
+    u = np.sort(w)[::-1]
+    css = np.cumsum(u) - 1
+    rho = np.nonzero(u - css / np.arange(1, len(w) + 1) > 0)[0][-1]
+    return np.maximum(w - css[rho] / (rho + 1), 0)
+
+
+def optimize_weights(
+    val_preds: np.ndarray, target: np.ndarray, w0: np.ndarray, iters: int = 500
+) -> np.ndarray:
+    """Minimize the validation MSE over convex weights by projected gradient descent."""
+    n = target.shape[0]
+    # step size 1 / L with L the Lipschitz constant of the gradient
+    lipschitz = 2 / n * np.linalg.norm(val_preds, ord=2) ** 2
+    if lipschitz == 0:
+        return w0
+    w = w0.copy()
+    for _ in range(iters):
+        grad = 2 / n * val_preds @ (w @ val_preds - target)
+        w = project_to_simplex(w - grad / lipschitz)
+    return w
+
+
+def run_ensemble(
+    journal, artifacts: ArtifactStore, top_k: int = 10, max_rounds: int = 50
+) -> dict | None:
+    """
+    Ensemble the cached predictions of the top-k good nodes and write the result to
+    <artifact store>/ensemble/ (submission.csv and weights.json). Nothing is re-run.
+    """
+    nodes, val_preds, test_preds, target = load_predictions(artifacts, journal.top_k(top_k))
+    if len(nodes) < 2:
+        logging.info("Not enough nodes with cached predictions to ensemble.")
+        return None
+
+    weights = greedy_selection(val_preds, target, max_rounds=max_rounds)
+    weights = optimize_weights(val_preds, target, weights)
+    error = float(mse(weights @ val_preds, target))
+    test_pred = weights @ test_preds
+
+    out_dir = artifacts.root / "ensemble"
+    out_dir.mkdir(parents=True, exist_ok=True)
+    result = {
+        "metric": error,
+        "best_single_metric": float(mse(val_preds, target).min()),
+        "weights": {node.id: float(w) for node, w in zip(nodes, weights) if w > 0},
+    }
+    with open(out_dir / "weights.json", "w") as f:
+        json.dump(result, f, indent=2)
+
+    # reuse the ids of the best node's submission and replace its prediction column
+    template = artifacts.path(nodes[0].id, "submission.csv")
+    if template.exists():
+        with open(template, newline="") as f:
+            rows = list(csv.reader(f))
+        if len(rows) - 1 == len(test_pred):
+            for row, pred in zip(rows[1:], test_pred):
+                row[-1] = repr(float(pred))
+            with open(out_dir / "submission.csv", "w", newline="") as f:
+                csv.writer(f).writerows(rows)
+        else:
+            logging.warning("The submission of the best node does not match its test predictions.")
+    logging.info(
+        f"Ensemble of {len(result['weights'])} nodes: validation MSE {error:.6f} "
+        f"(best single node {result['best_single_metric']:.6f})"
+    )
+    return result
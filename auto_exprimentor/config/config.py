@@ -4,15 +4,88 @@ from pathlib import Path
 
 
 # ================  TODO: config ================
+# every run gets its own directory, so parallel runs do not overwrite each other's files
+run_dir = Path(f"data/codes/{datetime.datetime.now()}").resolve()
+
 config = {
     # experiment configurations
     "exp_name": "ML2025_HW2",
     "data_dir": Path("data/ML2025Spring-hw2-public").resolve(),
-    "code_save_dir": Path(f"data/codes/{datetime.datetime.now()}").resolve(),
+    # artifact store of the run: code, submission and predictions of every node (content-addressed)
+    "code_save_dir": run_dir,
+    # working directory of the generated code (inside the run directory), its outputs are moved into the artifact store
+    "work_dir": run_dir / "workspace",
+    # keep the journal in a SQLite database instead of memory (None to disable)
+    "journal_path": None,
+    # move large node payloads (code, outputs) of the in-memory journal to a blob store (None to disable)
+    "blob_dir": None,
     # the description of the task
     "task_goal": "Given the survey results from the past two days in a specific state in the U.S.,\
                   predict the probability of testing positive on day 3. \
                   The evaluation metric is Mean Squared Error (MSE).",
+    # the models used for each kind of LLM call, in order of preference (later ones are fallbacks)
+    "models": {
+        "routes": {
+            # drafting, improving and debugging code
+            "code": ["llama3.1:8b-instruct-q8_0", "glm-4-flash-250414"],
+            # cheap calls: parsing execution results, summaries
+            "feedback": ["qwen2.5:3b-instruct", "llama3.1:8b-instruct-q8_0"],
+        },
+        # a model is skipped for `cooldown` seconds when its recent p95 latency or error rate is over the limit
+        "max_p95_latency": 120.0,
+        "max_error_rate": 0.5,
+        "cooldown": 300.0,
+    },
+    # retry policy and per-backend rate limits of the LLM calls
+    "chat": {
+        "max_retries": 5,
+        # backoff delay is drawn from [0, min(backoff_max, backoff_base * 2 ** attempt)]
+        "backoff_base": 1.0,
+        "backoff_max": 60.0,
+        "limits": {
+            "glm": {
+                "requests_per_minute": 60,
+                "tokens_per_minute": 200000,
+                "max_concurrency": 4,
+                "latency_target": 60.0,
+            },
+            "llama": {
+                "requests_per_minute": 600,
+                "tokens_per_minute": 1000000,
+                "max_concurrency": 1,
+                "latency_target": 300.0,
+            },
+            "qwen": {
+                "requests_per_minute": 600,
+                "tokens_per_minute": 1000000,
+                "max_concurrency": 1,
+                "latency_target": 300.0,
+            },
+        },
+    },
+    # CPU pinning and limits of the processes running the generated code (None: no limit)
+    "resources": {
+        # cores pinned per process, processes get disjoint cores while there are enough
+        "cpu_cores": None,
+        # BLAS/OpenMP threads per process (None: same as cpu_cores)
+        "threads": None,
+        # address space limit per process in GB, exceeding it gives MemoryLimitExceeded
+        "memory_gb": None,
+        # CPU seconds per execution, exceeding it gives CPUTimeLimitExceeded
+        "cpu_seconds": None,
+    },
+    # phase timings and counters, written to code_save_dir after every step
+    "tracing": {
+        "prometheus_file": "metrics.prom",
+        "chrome_trace_file": "trace.json",
+    },
+    # ensemble the cached predictions of the best nodes after the search
+    "ensemble": {
+        "enabled": True,
+        "top_k": 10,
+        # rounds of greedy forward selection (with replacement)
+        "max_rounds": 50,
+    },
     "agent": {
         # the number of iterations
         "steps": 1,
@@ -22,6 +95,49 @@ config = {
             # the number of draft generated before improving/debugging
             "num_drafts": 1,
         },
+        # prompt context: the best `top_k` nodes within `max_tokens` are kept in the memory
+        "context": {
+            "max_tokens": 2000,
+            "top_k": 5,
+            "preview_tokens": 1000,
+        },
+        # features of the training data ranked by relevance (correlation, mutual information) in the data preview
+        "data_preview": {
+            # the target column (None: the column of the training file missing from the test file)
+            "target": "tested_positive",
+            # statistics are computed on the first `sample_rows` rows
+            "sample_rows": 10000,
+            # only the `max_features` most relevant features are listed
+            "max_features": 30,
+            # of a group of features with |correlation| over the threshold, only the most relevant is listed
+            "collinear_threshold": 0.95,
+        },
+        # split code into "# %%" stages and re-run only the changed ones in a warm session per lineage
+        "incremental": {
+            "enabled": False,
+            # the number of warm sessions (child processes) kept alive at the same time
+            "max_sessions": 2,
+        },
+        # tune the numeric hyperparameters of the selected node locally instead of improving it with the LLM
+        "sweep": {
+            "enabled": False,
+            # the probability of sweeping instead of improving (each node is swept at most once)
+            "prob": 0.3,
+            "num_variants": 8,
+            # the number of worker processes (None: as many as resources.cpu_cores allows, else all cores)
+            "workers": None,
+            # wall-clock limit of the whole sweep (also bounded by the remaining budget)
+            "timeout": 1800,
+        },
+        # stop the search and shrink timeouts when the budget runs out (None: unlimited)
+        "budget": {
+            "wall_seconds": None,
+            "cpu_seconds": None,
+            # a node may run `timeout_slack` times longer than its parent
+            "timeout_slack": 3.0,
+            "min_timeout": 60,
+            "max_timeout": 3600,
+        },
     },
 }
 
@@ -0,0 +1,98 @@
+import json
+import os
+import shutil
+from pathlib import Path
+
+from .blobs import BlobStore
+from .nodes import Node
+
+
+class ArtifactStore:
+    """
+    Artifacts (code, submission, predictions) of every node, keyed by node id and content hash.
+
+    Layout of the store:
+        objects/ab/abcd...    one file per distinct content (BlobStore)
+        nodes/<id>/<name>     hard links to the objects, so equal files share their storage
+        best -> nodes/<id>    symlink to the best node, promoting a node only swaps this link
+        manifest.jsonl        one line per node: step, metric, is_buggy and artifact hashes
+    """
+
+    def __init__(self, root: str | Path):
+        self.root = Path(root)
+        self.objects = BlobStore(self.root / "objects")
+        self.nodes_dir = self.root / "nodes"
+        self.nodes_dir.mkdir(parents=True, exist_ok=True)
+        self.manifest_path = self.root / "manifest.jsonl"
+        self.manifest: dict[str, dict] = {}
+        if self.manifest_path.exists():
+            with open(self.manifest_path) as f:
+                for line in f:
+                    entry = json.loads(line)
+                    self.manifest[entry["node_id"]] = entry
+
+    def __len__(self) -> int:
+        return len(self.manifest)
+
+    def has(self, node_id: str) -> bool:
+        return node_id in self.manifest
+
+    def path(self, node_id: str, name: str) -> Path:
+        return self.nodes_dir / node_id / name
+
+    def _link(self, key: str, node_id: str, name: str) -> None:
+        target = self.path(node_id, name)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        if target.exists():
+            target.unlink()
+        try:
+            os.link(self.objects.path(key), target)
+        except OSError:
+            # e.g. a filesystem without hard links
+            shutil.copyfile(self.objects.path(key), target)
+
+    def add_node(self, node: Node, files: dict[str, Path] | None = None) -> dict:
+        """
+        Store the code of the node and the given output files (moved into the store),
+        and append its entry to the manifest.
+        """
+        artifacts = {}
+        key = self.objects.put(node.code.encode("utf-8"))
+        self._link(key, node.id, "solution.py")
+        artifacts["solution.py"] = key
+        for name, path in (files or {}).items():
+            path = Path(path)
+            if not path.exists():
+                continue
+            with open(path, "rb") as f:
+                key = self.objects.put(f.read())
+            path.unlink()
+            self._link(key, node.id, name)
+            artifacts[name] = key
+
+        entry = {
+            "node_id": node.id,
+            "step": node.step,
+            "metric": node.metric,
+            "is_buggy": bool(node.is_buggy),
+            "artifacts": artifacts,
+        }
+        self.manifest[node.id] = entry
+        with open(self.manifest_path, "a") as f:
+            f.write(json.dumps(entry) + "\n")
+        return entry
+
+    @property
+    def best_id(self) -> str | None:
+        best_link = self.root / "best"
+        if not best_link.is_symlink():
+            return None
+        return Path(os.readlink(best_link)).name
+
+    def promote(self, node_id: str) -> None:
+        """Point `best` at the node's artifacts (an atomic symlink swap, nothing is copied)."""
+        tmp_link = self.root / f"best.{os.getpid()}.tmp"
+        if tmp_link.is_symlink():
+            tmp_link.unlink()
+        os.symlink(Path("nodes") / node_id, tmp_link)
+        os.replace(tmp_link, self.root / "best")
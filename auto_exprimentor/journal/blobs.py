@@ -0,0 +1,30 @@
+import hashlib
+import os
+from pathlib import Path
+
+
+class BlobStore:
+    """A content-addressed store for large payloads, keyed by the sha256 of their bytes."""
+
+    def __init__(self, root: str | Path):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    def path(self, key: str) -> Path:
+        return self.root / key[:2] / key
+
+    def put(self, data: bytes) -> str:
+        """Store the data (once per distinct content) and return its key."""
+        key = hashlib.sha256(data).hexdigest()
+        path = self.path(key)
+        if not path.exists():
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_name(f"{key}.{os.getpid()}.tmp")
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        return key
+
+    def get(self, key: str) -> bytes:
+        with open(self.path(key), "rb") as f:
+            return f.read()
@@ -1,15 +1,21 @@
 from dataclasses import dataclass, field
-from dataclasses_json import DataClassJsonMixin
 
-from typing import List
+from typing import Dict, List, Optional
+from .blobs import BlobStore
 from .nodes import Node
+from .tree import TreeIndex
 
 
 @dataclass
-class Journal(DataClassJsonMixin):
+class Journal:
     """A collection of nodes representing the solution tree."""
 
     nodes: List[Node] = field(default_factory=list)
+    # if set, large node payloads are moved to this store when nodes are appended
+    blob_store: Optional[BlobStore] = None
+    # tree analytics (depth, root, subtree best/size) maintained by append
+    tree: TreeIndex = field(default_factory=TreeIndex, repr=False)
+    nodes_by_id: Dict[str, Node] = field(default_factory=dict, repr=False)
 
     def __getitem__(self, idx: int) -> Node:
         return self.nodes[idx]
@@ -20,7 +26,16 @@ class Journal(DataClassJsonMixin):
     def append(self, node: Node) -> None:
         """Append a new node to the journal."""
         node.step = len(self.nodes)
+        if self.blob_store is not None:
+            node.spill(self.blob_store)
         self.nodes.append(node)
+        self.nodes_by_id[node.id] = node
+        self.tree.add(
+            node.id, node.parent.id if node.parent else None, node.metric, node.is_buggy
+        )
+
+    def get_node(self, node_id: str) -> Optional[Node]:
+        return self.nodes_by_id.get(node_id)
 
     @property
     def draft_nodes(self) -> List[Node]:
@@ -32,6 +47,11 @@ class Journal(DataClassJsonMixin):
         """Return a list of nodes that are considered buggy by the agent."""
         return [node for node in self.nodes if node.is_buggy]
 
+    @property
+    def buggy_leaf_nodes(self) -> List[Node]:
+        """Return the buggy nodes without children (the candidates for debugging)."""
+        return [node for node in self.buggy_nodes if not self.tree.children[node.id]]
+
     @property
     def good_nodes(self) -> List[Node]:
         """Return a list of nodes that are considered good by the agent."""
@@ -54,6 +74,21 @@ class Journal(DataClassJsonMixin):
         # Now the validation metric is loss(MSE), so the less, the better.
         return min(need_nodes, key=lambda n: n.metric)
 
+    @property
+    def best_node(self) -> Node:
+        """The best good node, looked up in the tree index."""
+        return self.get_node(self.tree.best_id)
+
+    def top_k(self, k: int, only_good: bool = True) -> List[Node]:
+        """Return the k nodes with the lowest validation metric."""
+        need_nodes = self.good_nodes if only_good else self.nodes
+        need_nodes = [node for node in need_nodes if node.metric is not None]
+        return sorted(need_nodes, key=lambda n: n.metric)[:k]
+
+    def stage_counts(self) -> Dict[str, int]:
+        """Return the number of draft, debug and improve nodes."""
+        return self.tree.stage_counts()
+
     def generate_summary(self, include_code: bool = False):
         """Generate a summary of the good nodes in the journal for the agent."""
         summary = []
@@ -68,3 +103,16 @@ class Journal(DataClassJsonMixin):
             summary.append("\n".join(strbuff))
 
         return "\n----------------------------------\n".join(summary)
+
+    def to_dict(self) -> Dict:
+        return {"nodes": [node.to_dict() for node in self.nodes]}
+
+    @classmethod
+    def from_dict(cls, d: Dict, blob_store: Optional[BlobStore] = None) -> "Journal":
+        journal = cls(blob_store=blob_store)
+        nodes_by_id = {}
+        for node_dict in d["nodes"]:
+            node = Node.from_dict(node_dict, parent=nodes_by_id.get(node_dict["parent_id"]))
+            nodes_by_id[node.id] = node
+            journal.append(node)
+        return journal
@@ -1,45 +1,166 @@
-from dataclasses import dataclass, field
+import json
 import time
-from typing import Literal, Optional
 import uuid
-from dataclasses_json import DataClassJsonMixin
+import zlib
+from typing import Literal, Optional
 from ..tools.interpreter import ExecutionResult
 from ..tools.text_processing import trim_long_string
+from .blobs import BlobStore
+
+# Text payloads shorter than this are kept as plain strings, longer ones are zlib-compressed.
+COMPRESS_THRESHOLD = 256
+# Compressed payloads larger than this are moved to the blob store by Node.spill().
+SPILL_THRESHOLD = 1024
+
+
+class SpilledPayload:
+    """Reference to a compressed payload that was moved to a BlobStore."""
+
+    __slots__ = ("store", "key")
+
+    def __init__(self, store: BlobStore, key: str):
+        self.store = store
+        self.key = key
+
+
+def pack_text(text: str | None):
+    """Compact representation of a text payload: None, a short str or zlib-compressed bytes."""
+    if text is None or len(text) < COMPRESS_THRESHOLD:
+        return text
+    return zlib.compress(text.encode("utf-8"))
+
+
+def unpack_text(payload) -> str | None:
+    if isinstance(payload, SpilledPayload):
+        payload = payload.store.get(payload.key)
+    if isinstance(payload, bytes):
+        return zlib.decompress(payload).decode("utf-8")
+    return payload
 
 
-@dataclass(eq=False)
-class Node(DataClassJsonMixin):
-    """A single node in the solution tree. Contains code, execution results, and evaluation infomation."""
-
-    # ---- code & plan ----
-    code: str
-    plan: str = field(default=None, kw_only=True)
-
-    # ---- general attrs ----
-    step: int = field(default=None, kw_only=True)
-    id: str = field(default_factory=lambda: uuid.uuid4().hex, kw_only=True)
-    ctime: float = field(default_factory=lambda: time.time(), kw_only=True)
-    parent: Optional["Node"] = field(default=None, kw_only=True)
-    children: set["Node"] = field(default_factory=set, kw_only=True)
-
-    # ---- execution info ----
-    _term_out: list[str] = field(default=None, kw_only=True)  # type: ignore
-    exec_time: float = field(default=None, kw_only=True)  # type: ignore
-    exc_type: str | None = field(default=None, kw_only=True)
-    exc_info: dict | None = field(default=None, kw_only=True)
-    exc_stack: list[tuple] | None = field(default=None, kw_only=True)
-
-    # ---- evaluation ----
-    # post-execution result analysis (findings/feedback)
-    analysis: str = field(default=None, kw_only=True)  # type: ignore
-    metric: float = field(default=None, kw_only=True)  # type: ignore
-    # whether the agent decided that the code is buggy
-    # -> always True if exc_type is not None or no valid metric
-    is_buggy: bool = field(default=None, kw_only=True)  # type: ignore
-
-    def __post_init__(self) -> None:
+class Node:
+    """
+    A single node in the solution tree. Contains code, execution results, and evaluation infomation.
+
+    Nodes use __slots__ and keep their text payloads (code, plan, analysis, output, stack)
+    compressed, so a node costs a few hundred bytes of metadata plus its compressed texts.
+    Large payloads can additionally be moved to a content-addressed blob store with `spill`.
+    """
+
+    __slots__ = (
+        # ---- code & plan ----
+        "_code",
+        "_plan",
+        # ---- general attrs ----
+        "step",
+        "id",
+        "ctime",
+        "parent",
+        "_children",
+        # ---- execution info ----
+        "_term_out",
+        "exec_time",
+        "exc_type",
+        "exc_info",
+        "_exc_stack",
+        # ---- evaluation ----
+        # post-execution result analysis (findings/feedback)
+        "_analysis",
+        "metric",
+        # whether the agent decided that the code is buggy
+        # -> always True if exc_type is not None or no valid metric
+        "is_buggy",
+        "__weakref__",
+    )
+
+    def __init__(
+        self,
+        code: str,
+        *,
+        plan: str = None,
+        step: int = None,
+        id: str = None,
+        ctime: float = None,
+        parent: Optional["Node"] = None,
+    ):
+        self.code = code
+        self.plan = plan
+        self.step = step
+        self.id = id or uuid.uuid4().hex
+        self.ctime = ctime or time.time()
+        self.parent = parent
+        self._children = None
+        self._term_out = None
+        self.exec_time = None
+        self.exc_type = None
+        self.exc_info = None
+        self._exc_stack = None
+        self._analysis = None
+        self.metric = None
+        self.is_buggy = None
+
         if self.parent is not None:
-            self.parent.children.add(self)
+            self.parent._add_child(self)
+
+    # ---- compressed payloads ----
+
+    @property
+    def code(self) -> str:
+        return unpack_text(self._code)
+
+    @code.setter
+    def code(self, value: str):
+        self._code = pack_text(value)
+
+    @property
+    def plan(self) -> str:
+        return unpack_text(self._plan)
+
+    @plan.setter
+    def plan(self, value: str):
+        self._plan = pack_text(value)
+
+    @property
+    def analysis(self) -> str:
+        return unpack_text(self._analysis)
+
+    @analysis.setter
+    def analysis(self, value: str):
+        self._analysis = pack_text(value)
+
+    @property
+    def exc_stack(self) -> list[tuple] | None:
+        stack = unpack_text(self._exc_stack)
+        if stack is None:
+            return None
+        return [tuple(frame) for frame in json.loads(stack)]
+
+    @exc_stack.setter
+    def exc_stack(self, value: list[tuple] | None):
+        self._exc_stack = None if value is None else pack_text(json.dumps(value))
+
+    @property
+    def term_out(self) -> str:
+        """Get the terminal output of the code execution (truncated when it was stored)."""
+        return unpack_text(self._term_out)
+
+    def spill(self, store: BlobStore) -> None:
+        """Move large compressed payloads to the blob store, they are read back on access."""
+        for name in ("_code", "_plan", "_analysis", "_term_out", "_exc_stack"):
+            payload = getattr(self, name)
+            if isinstance(payload, bytes) and len(payload) > SPILL_THRESHOLD:
+                setattr(self, name, SpilledPayload(store, store.put(payload)))
+
+    # ---- tree ----
+
+    @property
+    def children(self) -> list["Node"]:
+        return self._children or []
+
+    def _add_child(self, child: "Node") -> None:
+        if self._children is None:
+            self._children = []
+        self._children.append(child)
 
     @property
     def stage_name(self) -> Literal["draft", "debug", "improve"]:
@@ -55,17 +176,13 @@ class Node(DataClassJsonMixin):
 
     def absorb_exec_result(self, exec_result: ExecutionResult):
         """Absorb the result of executing the code from this node."""
-        self._term_out = exec_result.term_out
+        # trim the output once here instead of on every read
+        self._term_out = pack_text(trim_long_string("".join(exec_result.term_out)))
         self.exec_time = exec_result.exec_time
         self.exc_type = exec_result.exc_type
         self.exc_info = exec_result.exc_info
         self.exc_stack = exec_result.exc_stack
 
-    @property
-    def term_out(self) -> str:
-        """Get the terminal output of the code execution (after truncating it)."""
-        return trim_long_string("".join(self._term_out))
-
     @property
     def is_leaf(self) -> bool:
         return not self.children
@@ -76,6 +193,12 @@ class Node(DataClassJsonMixin):
     def __hash__(self):
         return hash(self.id)
 
+    def __repr__(self):
+        return (
+            f"{type(self).__name__}(id={self.id!r}, step={self.step}, "
+            f"metric={self.metric}, is_buggy={self.is_buggy})"
+        )
+
     @property
     def debug_depth(self) -> int:
         """
@@ -84,6 +207,47 @@ class Node(DataClassJsonMixin):
         - 1 if the parent is buggy but the skip parent isn't
         - n if ther were n consecutive debugging steps
         """
-        if self.stage_name != "debug":
-            return 0
-        return self.parent.debug_depth + 1
+        depth, node = 0, self
+        while node.stage_name == "debug":
+            depth, node = depth + 1, node.parent
+        return depth
+
+    def to_dict(self) -> dict:
+        """A flat, JSON-serializable dict of the node (the parent is referenced by id)."""
+        return {
+            "id": self.id,
+            "step": self.step,
+            "ctime": self.ctime,
+            "parent_id": self.parent.id if self.parent else None,
+            "code": self.code,
+            "plan": self.plan,
+            "term_out": self.term_out,
+            "exec_time": self.exec_time,
+            "exc_type": self.exc_type,
+            "exc_info": self.exc_info,
+            "exc_stack": self.exc_stack,
+            "analysis": self.analysis,
+            "metric": self.metric,
+            "is_buggy": self.is_buggy,
+        }
+
+    @classmethod
+    def from_dict(cls, d: dict, parent: Optional["Node"] = None) -> "Node":
+        """Rebuild a node from `to_dict`, the parent node has to be passed in."""
+        node = cls(
+            d["code"],
+            plan=d["plan"],
+            step=d["step"],
+            id=d["id"],
+            ctime=d["ctime"],
+            parent=parent,
+        )
+        node._term_out = pack_text(d["term_out"])
+        node.exec_time = d["exec_time"]
+        node.exc_type = d["exc_type"]
+        node.exc_info = d["exc_info"]
+        node.exc_stack = d["exc_stack"]
+        node.analysis = d["analysis"]
+        node.metric = d["metric"]
+        node.is_buggy = d["is_buggy"]
+        return node
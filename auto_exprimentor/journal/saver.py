@@ -1,22 +1,17 @@
+from .artifacts import ArtifactStore
 from .journals import Journal
 from ..config.config import Config
-import os
 
 
-# Define a function to save the best solution and other good solutions to files.
-def save_run(cfg: Config, journal: Journal):
-    # Save dir for generated codes
-    save_dir = cfg.code_save_dir
-    os.makedirs(save_dir, exist_ok=True)
+# Define a function to save the best solution to the artifact store.
+def save_run(cfg: Config, journal: Journal, artifacts: ArtifactStore):
+    # Nodes are added to the store when they are executed, make sure the best one is there.
+    best_node = journal.get_best_node(only_good=True)
+    if best_node is None:
+        return
+    if not artifacts.has(best_node.id):
+        artifacts.add_node(best_node)
 
-    # Retrieve and save the best found solution.
-    best_node = journal.get_best_node(only_good=False)
-    best_solution_save_path = os.path.join(save_dir, "best_solution.py")
-    with open(best_solution_save_path, "w") as f:
-        f.write(best_node.code)
-    # Retrieve all good solution nodes.
-    good_nodes = journal.good_nodes
-    for i, node in enumerate(good_nodes):
-        solution_i_save_path = os.path.join(save_dir, f"good_solution_{i}.py")
-        with open(solution_i_save_path, "w") as f:
-            f.write(node.code)
+    # Promoting the best node is a pointer update, nothing is rewritten.
+    if artifacts.best_id != best_node.id:
+        artifacts.promote(best_node.id)
@@ -0,0 +1,296 @@
+import json
+import sqlite3
+import weakref
+from pathlib import Path
+from typing import Dict, Iterator, List, Literal, Optional
+
+from .nodes import Node, pack_text
+from .tree import TreeIndex, _to_float
+
+
+# Columns that are always loaded with a node; everything else is fetched lazily.
+META_COLUMNS = ("id", "step", "parent_id", "ctime", "exec_time", "exc_type", "metric", "is_buggy")
+# Node attributes of the large fields and their columns, stored as TEXT (JSON for the structured ones).
+LAZY_COLUMNS = {
+    "_code": "code",
+    "_plan": "plan",
+    "_analysis": "analysis",
+    "_term_out": "term_out",
+    "exc_info": "exc_info",
+    "_exc_stack": "exc_stack",
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS nodes (
+    id        TEXT PRIMARY KEY,
+    step      INTEGER NOT NULL,
+    parent_id TEXT,
+    ctime     REAL,
+    exec_time REAL,
+    exc_type  TEXT,
+    metric    REAL,
+    is_buggy  INTEGER NOT NULL DEFAULT 0,
+    code      TEXT,
+    plan      TEXT,
+    analysis  TEXT,
+    term_out  TEXT,
+    exc_info  TEXT,
+    exc_stack TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_nodes_step ON nodes(step);
+CREATE INDEX IF NOT EXISTS idx_nodes_parent ON nodes(parent_id);
+CREATE INDEX IF NOT EXISTS idx_nodes_metric ON nodes(metric);
+CREATE INDEX IF NOT EXISTS idx_nodes_buggy ON nodes(is_buggy, metric);
+"""
+
+
+class _LazyField:
+    """A non-data descriptor that loads a StoredNode attribute on first access and caches it on the instance."""
+
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    def __get__(self, node, owner=None):
+        if node is None:
+            return self
+        journal = node._journal
+        if self.name == "parent":
+            value = journal.get_node(node._parent_id) if node._parent_id else None
+        elif self.name == "children":
+            value = journal.children_of(node.id)
+        else:
+            value = journal._load_field(node.id, self.name)
+        node.__dict__[self.name] = value
+        return value
+
+
+class StoredNode(Node):
+    """
+    A Node backed by a row of a SQLiteJournal.
+    Only the metadata is loaded up front; code, outputs and tree links are fetched on first access.
+    """
+
+    _code = _LazyField()
+    _plan = _LazyField()
+    _analysis = _LazyField()
+    _term_out = _LazyField()
+    exc_info = _LazyField()
+    _exc_stack = _LazyField()
+    parent = _LazyField()
+    children = _LazyField()
+
+    def __init__(self, journal: "SQLiteJournal", row: sqlite3.Row):
+        # Node.__init__ is skipped on purpose so that lazy fields stay unset.
+        self._journal = journal
+        self._parent_id = row["parent_id"]
+        self.id = row["id"]
+        self.step = row["step"]
+        self.ctime = row["ctime"]
+        self.exec_time = row["exec_time"]
+        self.exc_type = row["exc_type"]
+        self.metric = row["metric"]
+        self.is_buggy = bool(row["is_buggy"])
+
+    @property
+    def is_leaf(self) -> bool:
+        return not self._journal.has_children(self.id)
+
+    # the stage and the debug depth come from the tree index instead of walking (querying) the parents
+
+    @property
+    def stage_name(self) -> Literal["draft", "debug", "improve"]:
+        return self._journal.tree.stage[self.id]
+
+    @property
+    def debug_depth(self) -> int:
+        return self._journal.tree.debug_depth[self.id]
+
+    def _add_child(self, child: Node) -> None:
+        # children are queried from the journal, only keep an already loaded list up to date
+        if "children" in self.__dict__:
+            self.__dict__["children"].append(child)
+
+
+class SQLiteJournal:
+    """
+    An on-disk journal with the same interface as Journal.
+    Nodes are kept in a SQLite database, so memory does not grow with the number of nodes
+    and analytics (metric history, best-k, stage counts) run as indexed queries.
+    """
+
+    def __init__(self, path: str | Path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(str(self.path))
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+        # Keep loaded nodes alive only while somebody references them.
+        self._cache: weakref.WeakValueDictionary[str, StoredNode] = (
+            weakref.WeakValueDictionary()
+        )
+        # tree analytics, rebuilt from the metadata columns when an existing journal is opened
+        self.tree = TreeIndex()
+        rows = self.conn.execute(
+            "SELECT id, parent_id, metric, is_buggy FROM nodes ORDER BY step"
+        )
+        for row in rows:
+            self.tree.add(row["id"], row["parent_id"], row["metric"], row["is_buggy"])
+
+    # ---- basic container interface ----
+
+    def __getitem__(self, idx: int) -> Node:
+        if idx < 0:
+            idx += len(self)
+        nodes = self._query("WHERE step = ?", (idx,))
+        if not nodes:
+            raise IndexError("journal index out of range")
+        return nodes[0]
+
+    def __len__(self) -> int:
+        return self.conn.execute("SELECT COUNT(*) FROM nodes").fetchone()[0]
+
+    def __iter__(self) -> Iterator[Node]:
+        return iter(self._query("ORDER BY step"))
+
+    def append(self, node: Node) -> None:
+        """Append a new node to the journal."""
+        node.step = len(self)
+        self.conn.execute(
+            "INSERT OR REPLACE INTO nodes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                node.id,
+                node.step,
+                node.parent.id if node.parent else None,
+                node.ctime,
+                node.exec_time,
+                node.exc_type,
+                _to_float(node.metric),
+                1 if node.is_buggy else 0,
+                node.code,
+                node.plan,
+                node.analysis,
+                node.term_out,
+                json.dumps(node.exc_info) if node.exc_info is not None else None,
+                json.dumps(node.exc_stack) if node.exc_stack is not None else None,
+            ),
+        )
+        self.conn.commit()
+        self.tree.add(
+            node.id, node.parent.id if node.parent else None, node.metric, node.is_buggy
+        )
+
+    def close(self) -> None:
+        self.conn.close()
+
+    # ---- node selection ----
+
+    @property
+    def nodes(self) -> List[Node]:
+        """Return all nodes ordered by step (metadata only, text fields stay lazy)."""
+        return self._query("ORDER BY step")
+
+    @property
+    def draft_nodes(self) -> List[Node]:
+        """Return a list of nodes representing initial coding drafts."""
+        return self._query("WHERE parent_id IS NULL ORDER BY step")
+
+    @property
+    def buggy_nodes(self) -> List[Node]:
+        """Return a list of nodes that are considered buggy by the agent."""
+        return self._query("WHERE is_buggy = 1 ORDER BY step")
+
+    @property
+    def buggy_leaf_nodes(self) -> List[Node]:
+        """Return the buggy nodes without children (the candidates for debugging)."""
+        return self._query(
+            "WHERE is_buggy = 1 AND NOT EXISTS "
+            "(SELECT 1 FROM nodes c WHERE c.parent_id = nodes.id) ORDER BY step"
+        )
+
+    @property
+    def good_nodes(self) -> List[Node]:
+        """Return a list of nodes that are considered good by the agent."""
+        return self._query("WHERE is_buggy = 0 ORDER BY step")
+
+    @property
+    def metric_history(self) -> List[float]:
+        """Return a list all metric values in the journal."""
+        rows = self.conn.execute("SELECT metric FROM nodes ORDER BY step")
+        return [row[0] for row in rows]
+
+    def get_best_node(self, only_good: bool = True) -> Node:
+        """Return the best solution found so far (node with the lowest validation loss)."""
+        nodes = self.top_k(1, only_good=only_good)
+        return nodes[0] if nodes else None
+
+    @property
+    def best_node(self) -> Node:
+        return self.get_best_node()
+
+    def top_k(self, k: int, only_good: bool = True) -> List[Node]:
+        """Return the k nodes with the lowest validation metric."""
+        where = "WHERE metric IS NOT NULL" + (" AND is_buggy = 0" if only_good else "")
+        return self._query(f"{where} ORDER BY metric ASC, step ASC LIMIT ?", (k,))
+
+    def stage_counts(self) -> Dict[str, int]:
+        """Return the number of draft, debug and improve nodes."""
+        return self.tree.stage_counts()
+
+    def generate_summary(self, include_code: bool = False):
+        """Generate a summary of the good nodes in the journal for the agent."""
+        columns = "plan, analysis, metric" + (", code" if include_code else "")
+        rows = self.conn.execute(
+            f"SELECT {columns} FROM nodes WHERE is_buggy = 0 ORDER BY step"
+        )
+        summary = []
+        for row in rows:
+            strbuff = []
+            strbuff.append(f"Design: {row['plan']}")
+            if include_code:
+                strbuff.append(f"Code: {row['code']}")
+            strbuff.append(f"Result: {row['analysis']}")
+            strbuff.append(f"Validation Metric (Mean Squared Error): {row['metric']}")
+
+            summary.append("\n".join(strbuff))
+
+        return "\n----------------------------------\n".join(summary)
+
+    # ---- lazy loading helpers used by StoredNode ----
+
+    def get_node(self, node_id: str) -> Optional[Node]:
+        nodes = self._query("WHERE id = ?", (node_id,))
+        return nodes[0] if nodes else None
+
+    def children_of(self, node_id: str) -> List[Node]:
+        return self._query("WHERE parent_id = ? ORDER BY step", (node_id,))
+
+    def has_children(self, node_id: str) -> bool:
+        row = self.conn.execute(
+            "SELECT 1 FROM nodes WHERE parent_id = ? LIMIT 1", (node_id,)
+        ).fetchone()
+        return row is not None
+
+    def _load_field(self, node_id: str, name: str):
+        column = LAZY_COLUMNS[name]
+        value = self.conn.execute(
+            f"SELECT {column} FROM nodes WHERE id = ?", (node_id,)
+        ).fetchone()[0]
+        if value is None:
+            return None
+        if name == "exc_info":
+            return json.loads(value)
+        return pack_text(value)
+
+    def _query(self, clause: str, params: tuple = ()) -> List[Node]:
+        rows = self.conn.execute(
+            f"SELECT {', '.join(META_COLUMNS)} FROM nodes {clause}", params
+        )
+        nodes = []
+        for row in rows:
+            node = self._cache.get(row["id"])
+            if node is None:
+                node = StoredNode(self, row)
+                self._cache[node.id] = node
+            nodes.append(node)
+        return nodes
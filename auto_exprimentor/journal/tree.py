@@ -0,0 +1,139 @@
+import json
+from pathlib import Path
+from typing import Literal, Optional
+
+
+def _to_float(value) -> Optional[float]:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class TreeIndex:
+    """
+    Tree analytics of a journal, maintained incrementally when nodes are appended.
+
+    Depth, root, stage, debug depth and subtree size/best of every node are stored,
+    so lineage queries are O(1) (path_to_root is O(depth)). Appending a node updates
+    the subtree statistics of its ancestors, which costs O(depth).
+    """
+
+    def __init__(self):
+        self.ids: list[str] = []
+        self.index: dict[str, int] = {}
+        self.parent: dict[str, Optional[str]] = {}
+        self.children: dict[str, list[str]] = {}
+        self.depth: dict[str, int] = {}
+        self.root: dict[str, str] = {}
+        self.stage: dict[str, Literal["draft", "debug", "improve"]] = {}
+        self.debug_depth: dict[str, int] = {}
+        self.metric: dict[str, Optional[float]] = {}
+        self.is_buggy: dict[str, bool] = {}
+        self.subtree_size: dict[str, int] = {}
+        # (metric, index) of the best good node in the subtree, None if there is none;
+        # equal metrics are broken by the index, so the first node seen wins (as in get_best_node)
+        self.subtree_best: dict[str, Optional[tuple[float, int]]] = {}
+        self.best: Optional[tuple[float, int]] = None
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __contains__(self, node_id: str) -> bool:
+        return node_id in self.index
+
+    def add(self, node_id: str, parent_id: Optional[str], metric, is_buggy) -> None:
+        metric, is_buggy = _to_float(metric), bool(is_buggy)
+        self.index[node_id] = len(self.ids)
+        self.ids.append(node_id)
+        self.parent[node_id] = parent_id
+        self.children[node_id] = []
+        self.metric[node_id] = metric
+        self.is_buggy[node_id] = is_buggy
+        self.subtree_size[node_id] = 1
+        best = (metric, self.index[node_id]) if not is_buggy and metric is not None else None
+        self.subtree_best[node_id] = best
+
+        if parent_id is None:
+            self.depth[node_id] = 0
+            self.root[node_id] = node_id
+            self.stage[node_id] = "draft"
+            self.debug_depth[node_id] = 0
+        else:
+            self.children[parent_id].append(node_id)
+            self.depth[node_id] = self.depth[parent_id] + 1
+            self.root[node_id] = self.root[parent_id]
+            if self.is_buggy[parent_id]:
+                self.stage[node_id] = "debug"
+                self.debug_depth[node_id] = self.debug_depth[parent_id] + 1
+            else:
+                self.stage[node_id] = "improve"
+                self.debug_depth[node_id] = 0
+
+        ancestor = parent_id
+        while ancestor is not None:
+            self.subtree_size[ancestor] += 1
+            if best is not None and (
+                self.subtree_best[ancestor] is None or best < self.subtree_best[ancestor]
+            ):
+                self.subtree_best[ancestor] = best
+            ancestor = self.parent[ancestor]
+        if best is not None and (self.best is None or best < self.best):
+            self.best = best
+
+    # ---- queries ----
+
+    @property
+    def best_id(self) -> Optional[str]:
+        """Id of the good node with the lowest metric."""
+        return self.ids[self.best[1]] if self.best else None
+
+    def root_id(self, node_id: str) -> str:
+        return self.root[node_id]
+
+    def path_to_root(self, node_id: str) -> list[str]:
+        """Ids from the node up to its root draft."""
+        path = [node_id]
+        while self.parent[path[-1]] is not None:
+            path.append(self.parent[path[-1]])
+        return path
+
+    def lineage_improvement(self, node_id: str) -> Optional[float]:
+        """How much the best node in the subtree improved on the node itself (positive is better)."""
+        best, metric = self.subtree_best[node_id], self.metric[node_id]
+        if best is None or metric is None or self.is_buggy[node_id]:
+            return None
+        return metric - best[0]
+
+    def stage_counts(self) -> dict[str, int]:
+        """The number of draft, debug and improve nodes."""
+        counts = {"draft": 0, "debug": 0, "improve": 0}
+        for stage in self.stage.values():
+            counts[stage] += 1
+        return counts
+
+    def roots(self) -> list[str]:
+        return [node_id for node_id in self.ids if self.parent[node_id] is None]
+
+    # ---- export ----
+
+    def to_adjacency(self) -> dict:
+        """A compact, column-oriented adjacency format (parent given as row index, -1 for roots)."""
+        return {
+            "id": self.ids,
+            "parent": [
+                -1 if self.parent[i] is None else self.index[self.parent[i]] for i in self.ids
+            ],
+            "stage": [self.stage[i] for i in self.ids],
+            "depth": [self.depth[i] for i in self.ids],
+            "metric": [self.metric[i] for i in self.ids],
+            "is_buggy": [self.is_buggy[i] for i in self.ids],
+            "subtree_size": [self.subtree_size[i] for i in self.ids],
+            "subtree_best": [
+                self.subtree_best[i][0] if self.subtree_best[i] else None for i in self.ids
+            ],
+        }
+
+    def export(self, path: str | Path) -> None:
+        with open(path, "w") as f:
+            json.dump(self.to_adjacency(), f)
@@ -1,20 +1,246 @@
 # chat.py
 
 import os
+import random
+import threading
+import time
+from dataclasses import dataclass
 from typing import Callable, Dict, List
 import logging
 
+from .tracing import tracer
+
+
+# HTTP status codes worth retrying: timeouts, conflicts, rate limits and server errors.
+TRANSIENT_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
+TRANSIENT_ERROR_NAMES = ("RateLimit", "Timeout", "Connection", "ServiceUnavailable", "Overloaded")
+
+
+class TokenBucket:
+    """
+    A thread-safe token bucket refilled at `rate` tokens per second up to `capacity`.
+    The level may go negative when a request turns out to be larger than estimated,
+    later requests then wait until the debt is paid back.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.level = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self, amount: float = 1.0) -> float:
+        """Block until `amount` tokens are available and take them. Return the time waited."""
+        amount = min(amount, self.capacity)
+        waited = 0.0
+        while True:
+            with self.lock:
+                self._refill()
+                if self.level >= amount:
+                    self.level -= amount
+                    return waited
+                delay = (amount - self.level) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+    def consume(self, amount: float) -> None:
+        """Take tokens without waiting (used to settle the difference to the real usage)."""
+        with self.lock:
+            self._refill()
+            self.level -= amount
+
+
+class AIMDLimiter:
+    """
+    Concurrency limiter with additive-increase / multiplicative-decrease.
+    The limit grows by one after `increase_every` healthy calls and halves on an error
+    or when a call is slower than `latency_target` seconds.
+    """
+
+    def __init__(
+        self,
+        initial: int = 4,
+        minimum: int = 1,
+        maximum: int = 16,
+        latency_target: float = 60.0,
+        increase_every: int = 5,
+    ):
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.latency_target = latency_target
+        self.increase_every = increase_every
+        self.in_flight = 0
+        self.healthy_calls = 0
+        self.cond = threading.Condition()
+
+    def acquire(self) -> None:
+        with self.cond:
+            while self.in_flight >= int(self.limit):
+                self.cond.wait()
+            self.in_flight += 1
+
+    def release(self, latency: float, ok: bool) -> None:
+        with self.cond:
+            self.in_flight -= 1
+            if not ok or latency > self.latency_target:
+                self.limit = max(self.minimum, self.limit / 2)
+                self.healthy_calls = 0
+            else:
+                self.healthy_calls += 1
+                if self.healthy_calls >= self.increase_every:
+                    self.limit = min(self.maximum, self.limit + 1)
+                    self.healthy_calls = 0
+            self.cond.notify_all()
+
+
+@dataclass
+class BackendLimits:
+    """Rate limits of one model backend."""
+
+    requests_per_minute: float = 60
+    tokens_per_minute: float = 200_000
+    max_concurrency: int = 4
+    latency_target: float = 60.0
+
+
+class BackendPolicy:
+    """Request/token buckets and the adaptive concurrency limit of one backend."""
+
+    def __init__(self, limits: BackendLimits):
+        self.requests = TokenBucket(
+            limits.requests_per_minute / 60, max(1.0, limits.requests_per_minute / 60)
+        )
+        self.tokens = TokenBucket(limits.tokens_per_minute / 60, limits.tokens_per_minute)
+        self.concurrency = AIMDLimiter(
+            initial=limits.max_concurrency,
+            maximum=limits.max_concurrency,
+            latency_target=limits.latency_target,
+        )
+
+
+def estimate_tokens(messages: list[dict]) -> int:
+    """Roughly estimate the number of tokens (about 4 characters per token)."""
+    return sum(len(str(message.get("content", ""))) for message in messages) // 4 + 1
+
+
+def _status_code(e: Exception) -> int | None:
+    for obj in (e, getattr(e, "response", None)):
+        for att in ("status_code", "http_status", "status"):
+            code = getattr(obj, att, None)
+            if isinstance(code, int):
+                return code
+    return None
+
+
+def is_transient_error(e: Exception) -> bool:
+    """Whether an exception raised by a backend is worth retrying."""
+    if isinstance(e, (TimeoutError, ConnectionError)):
+        return True
+    if _status_code(e) in TRANSIENT_STATUS_CODES:
+        return True
+    return any(name in type(e).__name__ for name in TRANSIENT_ERROR_NAMES)
+
+
+def retry_after(e: Exception) -> float | None:
+    """Read the Retry-After header of a rate-limit response, if any."""
+    headers = getattr(getattr(e, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
 
 class ChatFactory:
     model_base_to_chat_func: dict[str, Callable] = {}
 
-    def __call__(self, _model: str, _messages: list[dict] = []) -> str:
+    def __init__(self):
+        self.max_retries = 5
+        self.backoff_base = 1.0
+        self.backoff_max = 60.0
+        self.backend_limits: dict[str, BackendLimits] = {}
+        self.policies: dict[str, BackendPolicy] = {}
+
+    def configure(self, chat_cfg) -> None:
+        """Set the retry policy and per-backend limits from the `chat` section of the config."""
+        self.max_retries = chat_cfg.max_retries
+        self.backoff_base = chat_cfg.backoff_base
+        self.backoff_max = chat_cfg.backoff_max
+        for model_base, limits in vars(chat_cfg.limits).items():
+            self.backend_limits[model_base] = BackendLimits(**vars(limits))
+        self.policies.clear()
+
+    def get_policy(self, model_base: str) -> BackendPolicy:
+        if model_base not in self.policies:
+            limits = self.backend_limits.get(model_base, BackendLimits())
+            self.policies[model_base] = BackendPolicy(limits)
+        return self.policies[model_base]
+
+    def backoff_delay(self, attempt: int, e: Exception) -> float:
+        """Exponential backoff with full jitter, honouring Retry-After when the backend sends it."""
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2**attempt))
+        return max(delay, retry_after(e) or 0.0)
+
+    def __call__(
+        self,
+        _model: str,
+        _messages: list[dict] = [],
+        max_retries: int | None = None,
+        on_attempt: Callable[[float, bool], None] | None = None,
+    ) -> str:
+        """
+        Call the backend of the model with rate limiting and retries. `on_attempt(latency, ok)` is
+        called after every request to the backend, with the latency of that request only (without
+        the throttling waits and backoff sleeps).
+        """
+        if max_retries is None:
+            max_retries = self.max_retries
         model_base = self.get_model_base(_model)
         if model_base not in self.model_base_to_chat_func:
             raise ValueError(f"Unsupported model: {_model}")
-        return self.model_base_to_chat_func[model_base](
-            model=_model, messages=_messages, temperature=0.8
-        )
+        chat_func = self.model_base_to_chat_func[model_base]
+        policy = self.get_policy(model_base)
+        estimated_tokens = estimate_tokens(_messages)
+
+        for attempt in range(max_retries + 1):
+            waited = policy.requests.acquire()
+            waited += policy.tokens.acquire(estimated_tokens)
+            if waited:
+                tracer.incr("llm_throttled_seconds", waited)
+            policy.concurrency.acquire()
+            start = time.monotonic()
+            try:
+                response = chat_func(model=_model, messages=_messages, temperature=0.8)
+            except Exception as e:
+                latency = time.monotonic() - start
+                policy.concurrency.release(latency, ok=False)
+                if on_attempt is not None:
+                    on_attempt(latency, False)
+                if attempt >= max_retries or not is_transient_error(e):
+                    raise
+                delay = self.backoff_delay(attempt, e)
+                tracer.incr("llm_backoff_retries")
+                logging.warning(
+                    f"{model_base} backend failed ({type(e).__name__}: {e}), retrying in {delay:.1f}s"
+                )
+                time.sleep(delay)
+                continue
+
+            latency = time.monotonic() - start
+            policy.concurrency.release(latency, ok=True)
+            if on_attempt is not None:
+                on_attempt(latency, True)
+            usage = getattr(response, "usage", None)
+            total_tokens = getattr(usage, "total_tokens", None)
+            if isinstance(total_tokens, int) and total_tokens > estimated_tokens:
+                policy.tokens.consume(total_tokens - estimated_tokens)
+            return response
 
     def register_model(self, _model: str):
         model_base = self.get_model_base(_model)
@@ -30,7 +256,7 @@ class ChatFactory:
                 client = ZhipuAI(api_key=api_key)
                 chat_func = client.chat.completions.create
                 self.model_base_to_chat_func[model_base] = chat_func
-            elif model_base == "llama":
+            elif model_base in ("llama", "qwen"):
                 # Use ollama server
                 import openai
 
@@ -55,12 +281,25 @@ class ChatFactory:
 chat_factory = ChatFactory()
 
 
-def chat(_model: str = "glm-4-flash-250414", _messages: list[dict] = []) -> str:
-    logging.info(format_chat_history(_messages))
+def chat(
+    _model: str = "glm-4-flash-250414",
+    _messages: list[dict] = [],
+    max_retries: int | None = None,
+    on_attempt: Callable[[float, bool], None] | None = None,
+) -> str:
+    logging.debug(format_chat_history(_messages))
     chat_factory.register_model(_model)
-    response = chat_factory(_model=_model, _messages=_messages)
+    with tracer.span("chat", model=_model):
+        response = chat_factory(
+            _model=_model, _messages=_messages, max_retries=max_retries, on_attempt=on_attempt
+        )
+    tracer.incr("llm_requests")
+    usage = getattr(response, "usage", None)
+    if usage is not None:
+        tracer.incr("llm_prompt_tokens", getattr(usage, "prompt_tokens", 0) or 0)
+        tracer.incr("llm_completion_tokens", getattr(usage, "completion_tokens", 0) or 0)
     ai_content = response.choices[0].message.content
-    logging.info(format_chat_history([{"role": "assistant", "content": ai_content}]))
+    logging.debug(format_chat_history([{"role": "assistant", "content": ai_content}]))
     return ai_content
 
 
@@ -1,31 +1,231 @@
+from __future__ import annotations
+
 from pathlib import Path
-import pandas as pd
 
+from .lazy import lazy_import
 
-def preview_csv(p: Path) -> str:
-    """Generate a textual preview of a csv file."""
+np = lazy_import("numpy")
+pd = lazy_import("pandas")
 
-    df = pd.read_csv(p)
 
-    preview = []
+def count_rows(p: Path) -> int:
+    """The number of data rows of a csv file, without parsing it."""
+    with open(p, "rb") as f:
+        return max(sum(1 for _ in f) - 1, 0)
+
+
+def infer_target(columns: dict[Path, list[str]]) -> str | None:
+    """
+    The target is the column of the training file (the one with the most columns) that the test
+    file lacks. Test-like files have all the training columns but one; other files (e.g. a sample
+    submission with the id and the target) are ignored. The largest test-like file wins.
+    """
+    if len(columns) < 2:
+        return None
+    train = max(columns, key=lambda p: (len(columns[p]), p.stat().st_size))
+    train_columns = set(columns[train])
+    test_like = [
+        p
+        for p, c in columns.items()
+        if p != train and set(c) < train_columns and len(train_columns - set(c)) == 1
+    ]
+    if not test_like:
+        return None
+    test = max(test_like, key=lambda p: p.stat().st_size)
+    (target,) = train_columns - set(columns[test])
+    return target
+
+
+def quantile_bins(X: np.ndarray, n_bins: int) -> np.ndarray:
+    """Bin every column of X (n, m) into (at most) n_bins quantile bins."""
+    inner = np.quantile(X, np.linspace(0, 1, n_bins + 1)[1:-1], axis=0)  # (n_bins - 1, m)
+    return (X[:, :, None] > inner.T[None, :, :]).sum(axis=-1)
+
+
+def mutual_information(codes: np.ndarray, y_codes: np.ndarray, n_bins: int) -> np.ndarray:
+    """
+    Mutual information (nats) between every binned column (n, m) and the binned target (n,),
+    with the Miller-Madow bias correction (independent columns get ~0 instead of ~bins^2 / 2n).
+    """
+    n, m = codes.shape
+    joint_index = (np.arange(m) * n_bins * n_bins)[None, :] + codes * n_bins + y_codes[:, None]
+    joint = np.bincount(joint_index.ravel(), minlength=m * n_bins * n_bins)
+    p_xy = joint.reshape(m, n_bins, n_bins) / n
+    p_x = p_xy.sum(axis=2, keepdims=True)
+    p_y = p_xy.sum(axis=1, keepdims=True)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        terms = np.where(p_xy > 0, p_xy * np.log(p_xy / (p_x * p_y)), 0.0)
+    bias = ((p_x > 0).sum(axis=(1, 2)) - 1) * ((p_y > 0).sum(axis=(1, 2)) - 1) / (2 * n)
+    return np.maximum(terms.sum(axis=(1, 2)) - bias, 0.0)
+
+
+def top_value_fraction(X: np.ndarray) -> np.ndarray:
+    """The fraction of rows taken by the most frequent value of every column of X (n, m)."""
+    n, m = X.shape
+    s = np.sort(X, axis=0)
+    new_run = np.ones_like(s, dtype=bool)
+    new_run[1:] = s[1:] != s[:-1]
+    run_id = np.cumsum(new_run, axis=0) - 1 + (np.arange(m) * n)[None, :]
+    run_lengths = np.bincount(run_id.ravel(), minlength=m * n).reshape(m, n)
+    return run_lengths.max(axis=1) / n
+
+
+def collinear_clusters(corr: np.ndarray, threshold: float) -> list[list[int]]:
+    """Groups of columns connected by |correlation| > threshold (union-find)."""
+    parent = list(range(len(corr)))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
 
-    preview.append(f"-> {str(p)} has {df.shape[0]} rows and {df.shape[1]} columns.")
+    for i, j in zip(*np.nonzero(np.triu(np.abs(corr) > threshold, k=1))):
+        parent[find(i)] = find(j)
+    clusters: dict[int, list[int]] = {}
+    for i in range(len(corr)):
+        clusters.setdefault(find(i), []).append(i)
+    return [c for c in clusters.values() if len(c) > 1]
 
-    # ================  TODO: Tell LLM agents which feature is useful for prediction ================
+
+def feature_stats(
+    df: pd.DataFrame,
+    target: str,
+    n_bins: int = 16,
+    collinear_threshold: float = 0.95,
+    near_constant: float = 0.99,
+) -> pd.DataFrame | None:
+    """
+    Relevance of the numeric features of df for the target, computed on the whole frame at once:
+    Pearson correlation, mutual information (quantile-binned), constant / near-constant columns
+    and collinearity clusters (only the feature most related to the target is kept per cluster).
+    Returns one row per feature sorted by relevance, with a `keep` column (None when there are no
+    numeric features or no rows with the target).
+    """
+    features = [
+        c
+        for c in df.select_dtypes("number").columns
+        if c != target and c.lower() != "id"
+    ]
+    X = df[features].fillna(df[features].mean()).fillna(0).to_numpy(dtype=np.float64)
+    if pd.api.types.is_numeric_dtype(df[target]):
+        y = df[target].to_numpy(dtype=np.float64)
+    else:
+        # class labels: the codes are arbitrary, but the mutual information does not depend on them
+        codes, _ = pd.factorize(df[target])
+        y = np.where(codes < 0, np.nan, codes).astype(np.float64)
+    rows = ~np.isnan(y)
+    X, y = X[rows], y[rows]
+    n = len(y)
+    if n == 0 or not features:
+        return None
+
+    std = X.std(axis=0)
+    constant = ~(std > 0)
+    Z = (X - X.mean(axis=0)) / np.where(constant, 1.0, std)
+    y_std = y.std()
+    y_z = (y - y.mean()) / (y_std if y_std > 0 else 1.0)
+    corr_target = Z.T @ y_z / n
+    mi = mutual_information(quantile_bins(X, n_bins), quantile_bins(y[:, None], n_bins)[:, 0], n_bins)
+
+    stats = pd.DataFrame(
+        {
+            "corr": corr_target,
+            "mi": mi,
+            "top_fraction": top_value_fraction(X),
+            "constant": constant,
+        },
+        index=features,
+    )
+    stats["near_constant"] = ~stats["constant"] & (stats["top_fraction"] >= near_constant)
+    stats["collinear_with"] = None
+    stats["keep"] = ~stats["constant"] & ~stats["near_constant"]
+
+    kept = np.flatnonzero(stats["keep"].to_numpy())
+    corr = Z[:, kept].T @ Z[:, kept] / n
+    relevance = stats["mi"].to_numpy() + np.abs(corr_target)
+    for cluster in collinear_clusters(corr, collinear_threshold):
+        members = kept[cluster]
+        best = members[np.argmax(relevance[members])]
+        for i in members:
+            if i != best:
+                stats.iloc[i, stats.columns.get_loc("collinear_with")] = features[best]
+                stats.iloc[i, stats.columns.get_loc("keep")] = False
+
+    stats["relevance"] = relevance
+    return stats.sort_values("relevance", ascending=False)
+
+
+def preview_csv(
+    p: Path,
+    target: str | None = None,
+    sample_rows: int = 10000,
+    max_features: int = 30,
+    train_columns: list[str] | None = None,
+    **stats_kwargs,
+) -> str:
+    """Generate a textual preview of a csv file (with the most relevant features when it has the target)."""
+
+    # statistics are computed on a bounded sample of the file
+    df = pd.read_csv(p, nrows=sample_rows)
+    n_rows = count_rows(p)
+
+    preview = []
+
+    preview.append(f"-> {str(p)} has {n_rows} rows and {df.shape[1]} columns.")
 
     cols = df.columns.tolist()
-    cols_str = ", ".join(cols)
-    preview.append(f"The columns are: {cols_str}")
+    # features are ranked on the training file only (not e.g. on a sample submission with the target)
+    if target is None or target not in cols or (train_columns is not None and cols != train_columns):
+        stats = None
+    else:
+        stats = feature_stats(df, target, **stats_kwargs)
+    if stats is None:
+        if train_columns is not None and cols == [c for c in train_columns if c != target]:
+            preview.append(f"The columns are those of the training data without the target {target}.")
+            return "\n".join(preview)
+        cols_str = ", ".join(cols)
+        preview.append(f"The columns are: {cols_str}")
+        return "\n".join(preview)
+
+    other = [c for c in df.columns if c != target and c not in stats.index]
+    preview.append(f"The target is {target}.")
+    if other:
+        preview.append(f"Non-numeric or id columns: {', '.join(other)}")
+
+    kept = stats[stats["keep"]]
+    preview.append(
+        f"Features ranked by relevance to the target (on {len(df)} rows; "
+        "corr: Pearson correlation, mi: mutual information):"
+    )
+    for name, row in kept.head(max_features).iterrows():
+        collinear = stats.index[stats["collinear_with"] == name].tolist()
+        line = f"  {name}: corr={row['corr']:+.3f}, mi={row['mi']:.3f}"
+        if collinear:
+            line += f" (collinear: {', '.join(collinear)})"
+        preview.append(line)
+    if len(kept) > max_features:
+        preview.append(f"  ... and {len(kept) - max_features} less relevant features")
 
+    constant = stats.index[stats["constant"] | stats["near_constant"]].tolist()
+    if constant:
+        preview.append(f"Constant or near-constant features (little information): {', '.join(constant)}")
     return "\n".join(preview)
 
 
-def data_preview_generate(base_path):
+def data_preview_generate(base_path, target: str | None = None, **preview_kwargs):
     """Generate a textual preview of a directory."""
 
     previews = []
-    files = [p for p in Path(base_path).iterdir()]
-    for f in sorted(files):
-        previews.append(preview_csv(f))
+    files = sorted(p for p in Path(base_path).iterdir())
+    # only the headers are read to find the target
+    columns = {f: pd.read_csv(f, nrows=0).columns.tolist() for f in files}
+    if target is None:
+        target = infer_target(columns)
+    train_columns = max((c for c in columns.values() if target in c), key=len, default=None)
+    for f in files:
+        previews.append(
+            preview_csv(f, target=target, train_columns=train_columns, **preview_kwargs)
+        )
 
     return "\n\n".join(previews)
@@ -0,0 +1,143 @@
+"""
+Notebook-style incremental execution on top of Interpreter(reset_session=False).
+
+Generated code is split into stages at "# %%" markers (e.g. load data / feature engineering /
+train and evaluate). Every lineage of the solution tree keeps a warm interpreter session, and
+only the stages from the first changed one onwards are executed again, starting from a snapshot
+of the session taken right after the last unchanged stage.
+"""
+
+import re
+from collections import OrderedDict
+from typing import Hashable
+
+from .interpreter import ExecutionResult, Interpreter
+from .lazy import lazy_import
+from .tracing import tracer
+
+humanize = lazy_import("humanize")
+
+CELL_MARKER = re.compile(r"^# ?%%.*$", re.MULTILINE)
+
+
+def split_cells(code: str) -> list[str]:
+    """Split code into notebook-style cells at "# %%" markers (the whole code is one cell without markers)."""
+    starts = [m.start() for m in CELL_MARKER.finditer(code)]
+    if not starts:
+        return [code]
+    if code[: starts[0]].strip():
+        # code before the first marker (e.g. imports) is a cell on its own
+        starts.insert(0, 0)
+    bounds = starts + [len(code)]
+    return [code[start:end] for start, end in zip(bounds, bounds[1:])]
+
+
+def common_prefix_length(a: list[str], b: list[str]) -> int:
+    n = 0
+    for x, y in zip(a, b):
+        if x.strip() != y.strip():
+            break
+        n += 1
+    return n
+
+
+class IncrementalRunner:
+    """
+    Runs code in warm interpreter sessions, one per lineage, re-executing only changed cells.
+
+    After every successful cell the session forks a paused snapshot of itself (copy-on-write),
+    and a changed cell is run from the snapshot of the cells before it. So stages that mutate
+    their inputs in place (e.g. `df.drop(..., inplace=True)`) see the same state as in a fresh
+    run. Snapshots cost memory as the active session modifies pages shared with them.
+    """
+
+    def __init__(self, max_sessions: int = 2, **interpreter_kwargs):
+        self.max_sessions = max_sessions
+        self.interpreter_kwargs = interpreter_kwargs
+        self.sessions: OrderedDict[Hashable, Interpreter] = OrderedDict()
+        # the cells whose effects are currently held by each session
+        self.executed: dict[Hashable, list[str]] = {}
+
+    def get_session(self, lineage: Hashable) -> Interpreter:
+        if lineage in self.sessions:
+            self.sessions.move_to_end(lineage)
+            return self.sessions[lineage]
+        while len(self.sessions) >= self.max_sessions:
+            old_lineage, old_session = self.sessions.popitem(last=False)
+            old_session.cleanup_session()
+            self.executed.pop(old_lineage, None)
+        self.sessions[lineage] = Interpreter(**self.interpreter_kwargs)
+        self.executed[lineage] = []
+        return self.sessions[lineage]
+
+    def run(self, code: str, lineage: Hashable, timeout=None) -> ExecutionResult:
+        cells = split_cells(code)
+        session = self.get_session(lineage)
+        if session.process is None:
+            # the session was never started or got killed (e.g. on timeout)
+            self.executed[lineage] = []
+
+        # always execute at least the last cell so that the result is reported again
+        n_cached = min(common_prefix_length(self.executed[lineage], cells), len(cells) - 1)
+        if n_cached:
+            try:
+                # snapshot i holds the state after cell i, never run on top of later cells
+                session.restore(n_cached - 1)
+            except RuntimeError:
+                session.cleanup_session()
+                n_cached = 0
+        self.executed[lineage] = self.executed[lineage][:n_cached]
+        if n_cached:
+            tracer.incr("session_cells_reused", n_cached)
+
+        output: list[str] = []
+        if n_cached:
+            output.append(f"[{n_cached} unchanged stage(s) reused from the warm session]\n")
+        exec_time, cpu_time = 0.0, 0.0
+        result = None
+        snapshots_ok = True
+        n_run = 0
+        for i in range(n_cached, len(cells)):
+            cell_timeout = None if timeout is None else max(timeout - exec_time, 1)
+            # padded with the lines of the cells before it, so tracebacks show the line numbers of the code
+            padding = "\n" * sum(cell.count("\n") for cell in cells[:i])
+            result = session.run(padding + cells[i], reset_session=(i == 0), timeout=cell_timeout)
+            n_run += 1
+            exec_time += result.exec_time
+            cpu_time += result.cpu_time or 0.0
+            # drop the per-cell execution time line, a summary is appended below
+            output.extend(result.term_out[:-1])
+            if result.exc_type is not None:
+                break
+            self.executed[lineage].append(cells[i])
+            if snapshots_ok:
+                try:
+                    session.snapshot()
+                except RuntimeError:
+                    snapshots_ok = False
+
+        if not snapshots_ok:
+            # without the snapshots the state cannot be reused, start fresh next time
+            session.cleanup_session()
+            self.executed[lineage] = []
+        if result.exc_type == "TimeoutError":
+            output.append(result.term_out[-1])
+        else:
+            output.append(
+                f"Execution time: {humanize.naturaldelta(exec_time)} seconds "
+                f"({n_run} of {len(cells)} stages executed, {n_cached} reused from the warm session)."
+            )
+        return ExecutionResult(
+            output,
+            exec_time,
+            result.exc_type,
+            result.exc_info,
+            result.exc_stack,
+            cpu_time,
+        )
+
+    def cleanup(self) -> None:
+        for session in self.sessions.values():
+            session.cleanup_session()
+        self.sessions.clear()
+        self.executed.clear()
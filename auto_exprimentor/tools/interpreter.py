@@ -4,31 +4,33 @@ DO NOT MODIFY THIS CELL
 Python interpreter for executing code snippets and capturing their output.
 """
 
+import contextlib
 import logging
+import multiprocessing
 import os
 import queue
+import resource
 import signal
 import sys
 import time
 import traceback
-import zipfile
 from pathlib import Path
-from shutil import rmtree
-import shutil
 from multiprocessing import Process, Queue
 from typing import Hashable, cast
 
-import humanize
-import rich
-import shutup
-from rich.logging import RichHandler
-from rich.syntax import Syntax
 from dataclasses import dataclass
-from dataclasses_json import DataClassJsonMixin
+
+from .lazy import lazy_import
+from .predictions import save_predictions
+from .resources import MemoryLimitExceeded, ResourceProfile, exit_reason
+from .tracing import tracer
+
+# Only needed to format the result in the parent, the children never load it.
+humanize = lazy_import("humanize")
 
 
 @dataclass
-class ExecutionResult(DataClassJsonMixin):
+class ExecutionResult:
     """
     Result of executing a code snippet in the interpreter.
     Contains the output, execution time, and exception information.
@@ -39,6 +41,7 @@ class ExecutionResult(DataClassJsonMixin):
     exc_type: str | None
     exc_info: dict | None = None
     exc_stack: list[tuple] | None = None
+    cpu_time: float | None = None
 
 
 def exception_summary(e, exec_file_name):
@@ -76,6 +79,12 @@ def exception_summary(e, exec_file_name):
     )  # Return the formatted traceback and exception details.
 
 
+def children_cpu_time() -> float:
+    """CPU time of the terminated subprocesses (e.g. joblib/loky workers of n_jobs=-1)."""
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
 # Define a class that redirects write operations to a multiprocessing queue.
 class RedirectQueue:
     def __init__(self, queue, timeout=5):
@@ -88,9 +97,9 @@ class RedirectQueue:
                 msg, timeout=self.timeout
             )  # Attempt to put the message into the queue.
         except queue.Full:
-            print.warning(
-                "Queue write timed out"
-            )  # Warn if the queue is full and the write times out.
+            sys.__stderr__.write(
+                "Queue write timed out\n"
+            )  # Warn if the queue is full (not via logging, its handlers may write to this stream).
 
     def flush(self):
         pass  # No operation is needed for flushing in this context.
@@ -102,6 +111,8 @@ class Interpreter:
         self,
         timeout: int = 3600,  # Default timeout of 3600 seconds.
         agent_file_name: str = "runfile.py",  # Default file name for writing the agent's code.
+        working_dir: str | Path | None = None,  # Working directory of the child process.
+        resources: ResourceProfile | None = None,  # CPU pinning and limits of the child process.
     ):
         """
         Simulates a standalone Python REPL with an execution time limit.
@@ -109,9 +120,15 @@ class Interpreter:
         Args:
             timeout (int, optional): Timeout for each code execution step. Defaults to 3600.
             agent_file_name (str, optional): The name for the agent's code file. Defaults to "runfile.py".
+            working_dir (str | Path, optional): Directory the code runs in (and writes its outputs to). Defaults to the current directory.
+            resources (ResourceProfile, optional): Cores, thread pools, memory and CPU time of the child process. Defaults to no limits.
         """
         self.timeout = timeout  # Save the timeout value.
         self.agent_file_name = agent_file_name  # Save the agent file name.
+        self.working_dir = working_dir  # Save the working directory.
+        self.resources = resources  # Save the resource profile.
+        # Slot of the child in the resource profile (interpreters get disjoint cores).
+        self.resource_slot = resources.next_slot() if resources else 0
         self.process: Process = (
             None  # Initialize the process attribute (will hold the child process).
         )
@@ -122,6 +139,18 @@ class Interpreter:
 
         shutup.mute_warnings()  # Mute all warnings before further execution.
 
+        if self.working_dir is not None:
+            # Relative output paths (e.g. submission.csv) end up in the working directory.
+            os.makedirs(self.working_dir, exist_ok=True)
+            os.chdir(self.working_dir)
+
+        if self.resources is not None:
+            # Pin the cores, cap the thread pools and limit the memory of the child.
+            self.resources.apply(self.resource_slot)
+
+        # Own process group, so that cleanup also kills snapshots and leftover subprocesses.
+        os.setpgrp()
+
         # Redirect both stdout and stderr to the provided result queue.
         # trunk-ignore(mypy/assignment)
         sys.stdout = sys.stderr = RedirectQueue(result_outq)
@@ -133,19 +162,66 @@ class Interpreter:
             result_outq
         )  # Set up the child process for capturing output.
 
-        global_scope: dict = (
-            {}
-        )  # Create an empty dictionary to serve as the global scope.
+        global_scope: dict = {
+            "save_predictions": save_predictions
+        }  # Create the global scope, with the helper for caching predictions.
+        self._session_loop(code_inq, result_outq, event_outq, global_scope, [])
+
+    def _fork_snapshot(self, queues: tuple, global_scope: dict, snapshots: list) -> None:
+        # The snapshot is a paused fork of this process: it holds the session state as it is now.
+        wake = multiprocessing.get_context("fork").Event()
+        snapshot = multiprocessing.get_context("fork").Process(
+            target=self._resume_snapshot,
+            args=(wake, queues, global_scope, list(snapshots)),
+        )
+        snapshot.start()
+        snapshots.append((snapshot.pid, wake))
+
+    def _resume_snapshot(self, wake, queues: tuple, global_scope: dict, snapshots: list) -> None:
+        wake.wait()  # Paused until the session is restored to this snapshot.
+        # Keep a copy of this state for later restores, then take over the session.
+        self._fork_snapshot(queues, global_scope, snapshots)
+        queues[2].put(("state:restored", os.getpid()))
+        self._session_loop(*queues, global_scope, snapshots)
+
+    def _session_loop(
+        self,
+        code_inq: Queue,
+        result_outq: Queue,
+        event_outq: Queue,
+        global_scope: dict,
+        snapshots: list,
+    ) -> None:
+        queues = (code_inq, result_outq, event_outq)
         while True:  # Continuously wait for new code to execute.
             code = code_inq.get()  # Retrieve code from the code input queue.
+            if code == ("snapshot",):
+                self._fork_snapshot(queues, global_scope, snapshots)
+                event_outq.put(("state:snapshot", len(snapshots) - 1))
+                continue
+            if isinstance(code, tuple) and code[0] == "restore":
+                # Drop the later snapshots, wake the requested one and hand the session over to it.
+                index = code[1]
+                for pid, _ in snapshots[index + 1 :]:
+                    with contextlib.suppress(ProcessLookupError):
+                        os.kill(pid, signal.SIGKILL)
+                snapshots[index][1].set()
+                for q in queues[1:]:
+                    q.close()
+                    q.join_thread()  # Flush the pending output before exiting.
+                os._exit(0)
             with open(
                 self.agent_file_name, "w"
             ) as f:  # Open the agent file for writing.
                 f.write(code)  # Write the received code into the file.
 
             event_outq.put(
-                ("state:ready",)
-            )  # Signal that the interpreter is ready to execute the code.
+                ("state:ready", os.getpid())
+            )  # Signal that the interpreter (with its pid) is ready to execute the code.
+            if self.resources is not None:
+                self.resources.arm_cpu_limit()  # CPU time limit of this execution.
+            cpu_start = time.process_time()  # CPU time used by this process so far.
+            children_cpu_start = children_cpu_time()  # And by its finished subprocesses.
             try:
                 # Compile and execute the code within the global scope.
                 exec(compile(code, self.agent_file_name, "exec"), global_scope)
@@ -160,13 +236,27 @@ class Interpreter:
                 )  # Put the traceback string into the result queue.
                 if e_cls_name == "KeyboardInterrupt":
                     e_cls_name = "TimeoutError"  # Convert a KeyboardInterrupt into a TimeoutError.
+                elif isinstance(e, MemoryError) and self.resources and self.resources.memory_gb:
+                    e_cls_name = MemoryLimitExceeded.__name__  # Out of memory under the limit.
 
                 event_outq.put(
-                    ("state:finished", e_cls_name, exc_info, exc_stack)
+                    (
+                        "state:finished",
+                        e_cls_name,
+                        exc_info,
+                        exc_stack,
+                        time.process_time() - cpu_start + children_cpu_time() - children_cpu_start,
+                    )
                 )  # Signal that execution finished with an error.
             else:
                 event_outq.put(
-                    ("state:finished", None, None, None)
+                    (
+                        "state:finished",
+                        None,
+                        None,
+                        None,
+                        time.process_time() - cpu_start + children_cpu_time() - children_cpu_start,
+                    )
                 )  # Signal that execution finished successfully.
 
             os.remove(self.agent_file_name)  # Remove the agent file after execution.
@@ -182,6 +272,8 @@ class Interpreter:
         # - event_outq: for receiving state events (like ready and finished).
         # trunk-ignore(mypy/var-annotated)
         self.code_inq, self.result_outq, self.event_outq = Queue(), Queue(), Queue()
+        # Imported in the parent (once) rather than at module import, the forked children inherit it.
+        import shutup  # noqa: F401
         self.process = Process(
             target=self._run_session,  # Set the target function for the child process.
             args=(
@@ -191,10 +283,51 @@ class Interpreter:
             ),  # Provide the necessary queues as arguments.
         )
         self.process.start()  # Start the child process.
+        self.active_pid = self.process.pid  # The process executing the code (changes on restore).
+
+    def _child_alive(self) -> bool:
+        if self.active_pid == self.process.pid:
+            return self.process.is_alive()
+        # A restored snapshot is not our child, check its state in /proc (zombies are dead).
+        try:
+            with open(f"/proc/{self.active_pid}/stat") as f:
+                return f.read().rsplit(")", 1)[1].split()[0] != "Z"
+        except OSError:
+            pass
+        try:
+            os.kill(self.active_pid, 0)
+            return True
+        except OSError:
+            return False
+
+    def snapshot(self) -> int:
+        """
+        Keep a copy of the current session state (a paused fork of the child) and return its index.
+        """
+        self.code_inq.put(("snapshot",))
+        try:
+            state = self.event_outq.get(timeout=10)
+        except queue.Empty:
+            raise RuntimeError("REPL child process failed to take a snapshot") from None
+        assert state[0] == "state:snapshot", state
+        return state[1]
+
+    def restore(self, index: int) -> None:
+        """
+        Continue the session from snapshot `index` (which is kept), the later snapshots are dropped.
+        """
+        self.code_inq.put(("restore", index))
+        try:
+            state = self.event_outq.get(timeout=10)
+        except queue.Empty:
+            raise RuntimeError("REPL child process failed to restore a snapshot") from None
+        assert state[0] == "state:restored", state
+        self.active_pid = state[1]
 
     def cleanup_session(self):
         if self.process is None:  # If there is no process, nothing to clean up.
             return
+        pgid = self.process.pid  # The child leads the process group of its snapshots.
         try:
             # Attempt to terminate the child process gracefully.
             self.process.terminate()  # Request the process to terminate.
@@ -215,32 +348,39 @@ class Interpreter:
                 f"Error during process cleanup: {e}"
             )  # Print an error message if cleanup fails.
         finally:
+            with contextlib.suppress(ProcessLookupError, PermissionError):
+                os.killpg(pgid, signal.SIGKILL)  # Kill the snapshots and leftover subprocesses.
             if self.process is not None:  # If the process exists,
                 self.process.close()  # Close the process.
                 self.process = None  # Reset the process attribute to None.
 
-    def run(self, code: str, reset_session=True) -> ExecutionResult:
+    def run(self, code: str, reset_session=True, timeout=None) -> ExecutionResult:
         """
         Execute the provided Python command in a separate process and return its output.
 
         Parameters:
             code (str): Python code to execute.
             reset_session (bool, optional): Whether to reset the interpreter session before executing the code. Defaults to True.
+            timeout (float, optional): Timeout for this execution only. Defaults to the interpreter's timeout.
 
         Returns:
             ExecutionResult: Object containing the output and metadata of the code execution.
         """
 
+        if timeout is None:
+            timeout = self.timeout  # Fall back to the interpreter-wide timeout.
+
         if reset_session:
-            if self.process is not None:
-                # If a previous process exists, clean it up before starting a new one.
-                self.cleanup_session()
-            self.create_process()  # Create a new child process.
+            with tracer.span("process_spawn"):
+                if self.process is not None:
+                    # If a previous process exists, clean it up before starting a new one.
+                    self.cleanup_session()
+                self.create_process()  # Create a new child process.
         else:
             # For the first execution, reset_session must be True.
             assert self.process is not None
 
-        assert self.process.is_alive()  # Ensure that the child process is running.
+        assert self._child_alive()  # Ensure that the child process is running.
 
         self.code_inq.put(code)  # Send the code to the child process via the queue.
 
@@ -258,7 +398,9 @@ class Interpreter:
         assert (
             state[0] == "state:ready"
         ), state  # Verify that the received state is "state:ready".
+        self.active_pid = state[1]
         start_time = time.time()  # Record the start time of execution.
+        trace_start = time.perf_counter()
 
         child_in_overtime = (
             False  # Flag to indicate if the child process has exceeded the timeout.
@@ -279,48 +421,71 @@ class Interpreter:
                 break  # Exit the loop if execution is finished.
             except queue.Empty:
                 # If no event is received, check whether the process is still alive.
-                if not child_in_overtime and not self.process.is_alive():
-                    msg = "REPL child process died unexpectedly"
-                    raise RuntimeError(msg) from None
+                if not child_in_overtime and not self._child_alive():
+                    # The child was killed (e.g. by the OOM killer or the CPU time limit).
+                    # (the exit code of a restored snapshot is unknown, it is not our child)
+                    exitcode = (
+                        self.process.exitcode if self.active_pid == self.process.pid else None
+                    )
+                    self.cleanup_session()
+                    e_cls_name = exit_reason(exitcode)
+                    self.result_outq.put(
+                        f"{e_cls_name}: the process running the code died (exit code {exitcode})\n"
+                    )
+                    self.result_outq.put("<|EOF|>")  # The child never sent its EOF marker.
+                    state = (
+                        None,
+                        e_cls_name,
+                        {"exitcode": exitcode},
+                        [],
+                        None,
+                    )
+                    exec_time = time.time() - start_time
+                    break
 
                 # If the process is still running, check if it has exceeded the timeout.
-                if self.timeout is None:
+                if timeout is None:
                     continue
                 running_time = time.time() - start_time  # Determine the running time.
-                if running_time > self.timeout:
+                if running_time > timeout:
                     print(
-                        f"Execution exceeded timeout of {self.timeout}s"
+                        f"Execution exceeded timeout of {timeout}s"
                     )  # Log a timeout message.
                     os.kill(
-                        self.process.pid, signal.SIGINT
+                        self.active_pid, signal.SIGINT
                     )  # Send SIGINT to the process.
                     child_in_overtime = (
                         True  # Mark that the process is now in overtime.
                     )
 
                     # If the process exceeds the timeout by more than 5 seconds, force cleanup.
-                    if running_time > self.timeout + 5:
+                    if running_time > timeout + 5:
                         self.cleanup_session()  # Clean up the child process.
+                        self.result_outq.put("<|EOF|>")  # The child never sent its EOF marker.
 
                         state = (
                             None,
                             "TimeoutError",
                             {},
                             [],
+                            None,
                         )  # Set state to indicate a timeout error.
                         exec_time = (
-                            self.timeout
+                            timeout
                         )  # Set the execution time to the timeout limit.
                         break
 
+        tracer.record("execution", trace_start, time.perf_counter())
+
         output: list[str] = []  # Initialize a list to collect output lines.
         # Collect all output from the result queue until the EOF marker is encountered.
         start_collect = time.time()  # Record the start time for output collection.
+        trace_start = time.perf_counter()
         while not self.result_outq.empty() or not output or output[-1] != "<|EOF|>":
             try:
                 # If output collection exceeds 5 seconds, log a warning.
                 if time.time() - start_collect > 5:
-                    print.warning("Output collection timed out")
+                    logging.warning("Output collection timed out")
                     break
                 output.append(
                     self.result_outq.get(timeout=1)
@@ -328,19 +493,22 @@ class Interpreter:
             except queue.Empty:
                 continue  # Continue if no output is available immediately.
         output.pop()  # Remove the EOF marker from the output list.
+        tracer.record("output_collection", trace_start, time.perf_counter())
 
         # Extract exception information from the finished state.
-        e_cls_name, exc_info, exc_stack = state[1:]
+        e_cls_name, exc_info, exc_stack, cpu_time = state[1:]
 
         if e_cls_name == "TimeoutError":
             # Append a timeout error message to the output if a timeout occurred.
             output.append(
-                f"TimeoutError: Execution exceeded the time limit of {humanize.naturaldelta(self.timeout)}"
+                f"TimeoutError: Execution exceeded the time limit of {humanize.naturaldelta(timeout)}"
             )
         else:
             # Append the execution time information to the output.
             output.append(
-                f"Execution time: {humanize.naturaldelta(exec_time)} seconds (time limit is {humanize.naturaldelta(self.timeout)})."
+                f"Execution time: {humanize.naturaldelta(exec_time)} seconds (time limit is {humanize.naturaldelta(timeout)})."
             )
         # Return an ExecutionResult object with all the execution details.
-        return ExecutionResult(output, exec_time, e_cls_name, exc_info, exc_stack)
+        return ExecutionResult(
+            output, exec_time, e_cls_name, exc_info, exc_stack, cpu_time
+        )
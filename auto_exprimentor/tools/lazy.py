@@ -0,0 +1,27 @@
+"""
+Deferred imports of heavy dependencies (pandas, numpy, humanize, ...).
+
+`lazy_import("pandas")` returns a module object right away and only executes the module on the
+first attribute access, so importing the package (and forking interpreter children from it) does
+not pay for dependencies a run never uses. Modules annotated with lazy modules need
+`from __future__ import annotations`, otherwise the annotations load them at definition time.
+"""
+
+import importlib.util
+import sys
+import types
+
+
+def lazy_import(name: str) -> types.ModuleType:
+    """Import a module lazily (an already imported module is returned as is)."""
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.find_spec(name)
+    if spec is None:
+        raise ModuleNotFoundError(f"No module named '{name}'", name=name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
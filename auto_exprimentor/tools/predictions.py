@@ -0,0 +1,30 @@
+"""
+Helper available to the generated code for caching its predictions.
+
+The interpreter puts `save_predictions` into the global scope of the executed code, so every
+node leaves its validation (out-of-fold) and test predictions behind as compact .npy files
+which can be ensembled later without re-running anything.
+"""
+
+import os
+
+VAL_PRED_FILE = "val_pred.npy"
+VAL_TARGET_FILE = "val_target.npy"
+TEST_PRED_FILE = "test_pred.npy"
+PREDICTION_FILES = (VAL_PRED_FILE, VAL_TARGET_FILE, TEST_PRED_FILE)
+
+
+def save_predictions(val_pred, val_target, test_pred, directory: str = ".") -> None:
+    """Save validation predictions, validation targets and test predictions as float32 .npy files."""
+    import numpy as np
+
+    val_pred = np.asarray(val_pred, dtype=np.float32).ravel()
+    val_target = np.asarray(val_target, dtype=np.float32).ravel()
+    test_pred = np.asarray(test_pred, dtype=np.float32).ravel()
+    if val_pred.shape != val_target.shape:
+        raise ValueError(
+            f"val_pred and val_target have different shapes: {val_pred.shape} != {val_target.shape}"
+        )
+    np.save(os.path.join(directory, VAL_PRED_FILE), val_pred)
+    np.save(os.path.join(directory, VAL_TARGET_FILE), val_target)
+    np.save(os.path.join(directory, TEST_PRED_FILE), test_pred)
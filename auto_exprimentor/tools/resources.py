@@ -0,0 +1,125 @@
+"""
+Resource profile of the interpreter child processes.
+
+Each child is pinned to its own slice of the available cores, its BLAS/OpenMP thread pools are
+capped to that slice and its address space and CPU time are limited, so that several candidates
+can run on one host without starving or OOM-killing each other.
+"""
+
+import itertools
+import os
+import resource
+import signal
+from dataclasses import dataclass
+
+THREAD_ENV_VARS = (
+    "OMP_NUM_THREADS",
+    "MKL_NUM_THREADS",
+    "OPENBLAS_NUM_THREADS",
+    "NUMEXPR_NUM_THREADS",
+    "VECLIB_MAXIMUM_THREADS",
+    # joblib / loky (n_jobs=-1)
+    "LOKY_MAX_CPU_COUNT",
+)
+
+
+class CPUTimeLimitExceeded(BaseException):
+    """
+    Raised in the child when its CPU time limit is reached (SIGXCPU). Like KeyboardInterrupt it
+    is not an Exception, so `except Exception:` in the generated code does not swallow it.
+    """
+
+
+class MemoryLimitExceeded(MemoryError):
+    """A MemoryError under the address space limit of the child."""
+
+
+def _raise_cpu_limit(signum, frame):
+    raise CPUTimeLimitExceeded("CPU time limit of the execution exceeded")
+
+
+def exit_reason(exitcode: int | None) -> str:
+    """exc_type of a child that died without reporting a result (negative exitcode: killed by signal)."""
+    if exitcode == -signal.SIGKILL:
+        # most likely the OOM killer
+        return "OutOfMemoryError"
+    if exitcode == -signal.SIGXCPU:
+        return "CPUTimeLimitExceeded"
+    return "ChildProcessDied"
+
+
+@dataclass
+class ResourceProfile:
+    # cores pinned per child (None: no pinning)
+    cpu_cores: int | None = None
+    # BLAS/OpenMP threads per child (None: same as cpu_cores)
+    threads: int | None = None
+    # address space limit per child in GB (None: unlimited)
+    memory_gb: float | None = None
+    # CPU seconds per execution (None: unlimited)
+    cpu_seconds: float | None = None
+
+    def __post_init__(self):
+        self._slots = itertools.count()
+        # read once, children pinned to a slot would only see their own cores
+        self.available_cpus = sorted(os.sched_getaffinity(0))
+
+    @classmethod
+    def from_config(cls, resources_cfg) -> "ResourceProfile":
+        return cls(**vars(resources_cfg))
+
+    def next_slot(self) -> int:
+        """A new slot index; children with different slots get disjoint cores (while there are enough)."""
+        return next(self._slots)
+
+    @property
+    def n_slots(self) -> int:
+        """How many children can run at the same time on disjoint cores."""
+        if not self.cpu_cores:
+            return len(self.available_cpus)
+        return max(1, len(self.available_cpus) // self.cpu_cores)
+
+    def cpus(self, slot: int) -> set[int] | None:
+        if not self.cpu_cores:
+            return None
+        n = min(self.cpu_cores, len(self.available_cpus))
+        start = (slot % self.n_slots) * n
+        return set(self.available_cpus[start : start + n])
+
+    def apply(self, slot: int) -> None:
+        """Apply the profile to the current (child) process."""
+        cpus = self.cpus(slot)
+        if cpus is not None:
+            os.sched_setaffinity(0, cpus)
+        threads = self.threads or (len(cpus) if cpus else None)
+        if threads:
+            for var in THREAD_ENV_VARS:
+                os.environ[var] = str(threads)
+            try:
+                # thread pools already loaded by the parent (the child is forked) ignore the env vars
+                from threadpoolctl import threadpool_limits
+
+                threadpool_limits(threads)
+            except ImportError:
+                pass
+        if self.memory_gb:
+            _, hard = resource.getrlimit(resource.RLIMIT_AS)
+            limit = int(self.memory_gb * 1024**3)
+            if hard != resource.RLIM_INFINITY:
+                limit = min(limit, hard)
+            resource.setrlimit(resource.RLIMIT_AS, (limit, hard))
+        if self.cpu_seconds:
+            signal.signal(signal.SIGXCPU, _raise_cpu_limit)
+
+    def arm_cpu_limit(self) -> None:
+        """Start the CPU time limit of the next execution (RLIMIT_CPU counts the whole process)."""
+        if not self.cpu_seconds:
+            return
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        used = usage.ru_utime + usage.ru_stime
+        # only the soft limit is set, so it can be raised again for the next execution of the session
+        _, hard = resource.getrlimit(resource.RLIMIT_CPU)
+        soft = int(used + self.cpu_seconds) + 1
+        if hard != resource.RLIM_INFINITY:
+            soft = min(soft, hard)
+        resource.setrlimit(resource.RLIMIT_CPU, (soft, hard))
@@ -0,0 +1,117 @@
+# router.py
+
+import logging
+import threading
+import time
+from collections import deque
+
+from .chat import chat
+from .tracing import tracer
+
+
+class ModelStats:
+    """Latency and error rate of the recent calls to one model."""
+
+    def __init__(self, window: int = 50):
+        self.latencies: deque[float] = deque(maxlen=window)
+        self.errors: deque[bool] = deque(maxlen=window)
+        self.last_call = 0.0
+        self.lock = threading.Lock()
+
+    def record(self, latency: float, ok: bool) -> None:
+        with self.lock:
+            self.latencies.append(latency)
+            self.errors.append(not ok)
+            self.last_call = time.monotonic()
+
+    @property
+    def p95_latency(self) -> float:
+        with self.lock:
+            if not self.latencies:
+                return 0.0
+            latencies = sorted(self.latencies)
+        return latencies[min(len(latencies) - 1, int(0.95 * len(latencies)))]
+
+    @property
+    def error_rate(self) -> float:
+        with self.lock:
+            return sum(self.errors) / len(self.errors) if self.errors else 0.0
+
+
+class ModelRouter:
+    """
+    Routes each kind of LLM call to a list of models, in order of preference.
+
+    Cheap calls (result parsing, summaries) go to the "feedback" models, drafts, improvements
+    and debugging to the "code" models. A model whose p95 latency or error rate is over the
+    limit is skipped until `cooldown` seconds have passed, and a failing call is retried on
+    the next model of the route.
+    """
+
+    def __init__(
+        self,
+        routes: dict[str, list[str]],
+        max_p95_latency: float = 120.0,
+        max_error_rate: float = 0.5,
+        cooldown: float = 300.0,
+        min_samples: int = 3,
+        failover_retries: int = 1,
+    ):
+        self.routes = routes
+        self.max_p95_latency = max_p95_latency
+        self.max_error_rate = max_error_rate
+        self.cooldown = cooldown
+        self.min_samples = min_samples
+        self.failover_retries = failover_retries
+        self.stats: dict[str, ModelStats] = {
+            model: ModelStats() for models in routes.values() for model in models
+        }
+
+    @classmethod
+    def from_config(cls, models_cfg) -> "ModelRouter":
+        kwargs = dict(vars(models_cfg))
+        routes = dict(vars(kwargs.pop("routes")))
+        return cls(routes, **kwargs)
+
+    def is_healthy(self, model: str) -> bool:
+        stats = self.stats[model]
+        if len(stats.latencies) < self.min_samples:
+            return True
+        if time.monotonic() - stats.last_call > self.cooldown:
+            # give the model another chance (half-open)
+            return True
+        return (
+            stats.p95_latency <= self.max_p95_latency
+            and stats.error_rate <= self.max_error_rate
+        )
+
+    def candidates(self, role: str) -> list[str]:
+        """The models of the route, healthy ones first (keeping the configured order)."""
+        models = self.routes[role]
+        healthy = [m for m in models if self.is_healthy(m)]
+        return healthy + [m for m in models if m not in healthy]
+
+    def chat(self, role: str, messages: list[dict]) -> str:
+        candidates = self.candidates(role)
+        last_error = None
+        for i, model in enumerate(candidates):
+            is_last = i == len(candidates) - 1
+            try:
+                # fail over quickly, only the last model gets the full retry policy;
+                # every request to the backend is recorded, without the local throttling waits
+                content = chat(
+                    _model=model,
+                    _messages=messages,
+                    max_retries=None if is_last else self.failover_retries,
+                    on_attempt=self.stats[model].record,
+                )
+            except Exception as e:
+                last_error = e
+                if not is_last:
+                    tracer.incr("llm_failovers")
+                    logging.warning(
+                        f"{model} failed ({type(e).__name__}: {e}), falling back to {candidates[i + 1]}"
+                    )
+                continue
+            return content
+        raise last_error
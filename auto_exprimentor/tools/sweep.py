@@ -0,0 +1,337 @@
+"""
+Local hyperparameter sweeps over the numeric literals of a solution.
+
+Tunable literals are found by static analysis (well-known hyperparameter keywords) or because
+the LLM marked their line with a "# tune" comment. Every variant runs in its own process: a master
+process executes the stages shared by all variants once (e.g. data loading, see
+incremental.split_cells) and forks the variants from there, so the data is loaded only once.
+"""
+
+import ast
+import contextlib
+import io
+import math
+import multiprocessing
+import multiprocessing.connection
+import os
+import queue
+import random
+import re
+import signal
+import time
+import traceback
+from dataclasses import dataclass, replace
+
+from .incremental import split_cells
+from .resources import ResourceProfile, exit_reason
+
+TUNE_MARKER = "# tune"
+TUNABLE_NAMES = {
+    "alpha",
+    "batch_size",
+    "c",
+    "colsample_bytree",
+    "dropout",
+    "epochs",
+    "gamma",
+    "l1_ratio",
+    "learning_rate",
+    "lr",
+    "max_depth",
+    "max_features",
+    "min_child_samples",
+    "min_child_weight",
+    "min_samples_leaf",
+    "min_samples_split",
+    "n_estimators",
+    "n_neighbors",
+    "num_leaves",
+    "reg_alpha",
+    "reg_lambda",
+    "subsample",
+    "weight_decay",
+}
+# hyperparameters that are fractions and must stay in (0, 1]
+FRACTION_NAMES = {"colsample_bytree", "dropout", "l1_ratio", "max_features", "subsample"}
+
+
+@dataclass
+class Tunable:
+    """A numeric literal in the code that can be tuned."""
+
+    name: str
+    lineno: int
+    col_offset: int
+    end_col_offset: int
+    value: int | float
+
+
+@dataclass
+class SweepResult:
+    values: dict
+    code: str
+    metric: float | None
+    output: str
+    exc_type: str | None = None
+
+
+def _is_number(node: ast.AST) -> bool:
+    return (
+        isinstance(node, ast.Constant)
+        and type(node.value) in (int, float)
+        and node.lineno == node.end_lineno
+    )
+
+
+def find_tunables(code: str) -> list[Tunable]:
+    """Find numeric hyperparameter literals in keyword arguments and assignments."""
+    try:
+        tree = ast.parse(code)
+    except SyntaxError:
+        return []
+    lines = code.splitlines()
+    tunables = {}
+    for node in ast.walk(tree):
+        if isinstance(node, ast.keyword) and node.arg is not None:
+            name, value = node.arg, node.value
+        elif (
+            isinstance(node, ast.Assign)
+            and len(node.targets) == 1
+            and isinstance(node.targets[0], ast.Name)
+        ):
+            name, value = node.targets[0].id, node.value
+        else:
+            continue
+        if not _is_number(value) or value.value == 0:
+            continue
+        marked = TUNE_MARKER in lines[value.lineno - 1]
+        if marked or name.lower() in TUNABLE_NAMES:
+            position = (value.lineno, value.col_offset)
+            tunables[position] = Tunable(
+                name, value.lineno, value.col_offset, value.end_col_offset, value.value
+            )
+    return [tunables[position] for position in sorted(tunables)]
+
+
+def sample_value(tunable: Tunable, rng: random.Random) -> int | float:
+    """Log-uniform sample within a factor of 3 around the current value."""
+    value = abs(tunable.value)
+    sample = math.exp(rng.uniform(math.log(value / 3), math.log(value * 3)))
+    if tunable.name.lower() in FRACTION_NAMES and value <= 1:
+        sample = min(sample, 1.0)
+    if isinstance(tunable.value, int):
+        sample = max(1, round(sample))
+    else:
+        sample = float(f"{sample:.4g}")
+    return sample if tunable.value > 0 else -sample
+
+
+def apply_values(code: str, tunables: list[Tunable], values: list) -> str:
+    """Replace the literals of the tunables by the given values."""
+    lines = code.splitlines(keepends=True)
+    # replace from the end so that earlier offsets stay valid (ast offsets are utf-8 byte offsets)
+    for tunable, value in sorted(
+        zip(tunables, values), key=lambda x: (x[0].lineno, x[0].col_offset), reverse=True
+    ):
+        line = lines[tunable.lineno - 1].encode("utf-8")
+        line = line[: tunable.col_offset] + repr(value).encode("utf-8") + line[tunable.end_col_offset :]
+        lines[tunable.lineno - 1] = line.decode("utf-8")
+    return "".join(lines)
+
+
+def make_variants(code: str, tunables: list[Tunable], n: int, seed: int = 0) -> list[tuple[dict, str]]:
+    """Random search: n distinct variants of the code with resampled tunables."""
+    rng = random.Random(seed)
+    variants, seen = [], set()
+    for _ in range(n * 10):
+        if len(variants) >= n:
+            break
+        values = [sample_value(tunable, rng) for tunable in tunables]
+        if tuple(values) in seen or values == [t.value for t in tunables]:
+            continue
+        seen.add(tuple(values))
+        names = {f"{t.name}@{t.lineno}": v for t, v in zip(tunables, values)}
+        variants.append((names, apply_values(code, tunables, values)))
+    return variants
+
+
+def extract_metric(output: str) -> float | None:
+    """Fallback when no predictions were saved: the last number printed after "MSE"."""
+    matches = re.findall(r"mse[^0-9\n]*?([-+]?\d*\.?\d+(?:[eE][-+]?\d+)?)", output, re.IGNORECASE)
+    return float(matches[-1]) if matches else None
+
+
+# ---- variant processes ----
+# Set in the master process before the variants are forked, the variants inherit them.
+_base_scope: dict = {}
+_suffixes: list[str] = []
+_work_dir: str = "."
+_resources: ResourceProfile | None = None
+
+
+def _run_variant(i: int, slot: int, conn) -> None:
+    # the result is small (the output is truncated), so it fits in the pipe buffer
+    conn.send(_run_variant_in_slot(i, slot))
+    conn.close()
+
+
+def _run_variant_in_slot(i: int, slot: int) -> tuple:
+    _resources.apply(slot)
+    _resources.arm_cpu_limit()
+    variant_dir = os.path.join(_work_dir, f"variant_{i}")
+    os.makedirs(variant_dir, exist_ok=True)
+    os.chdir(variant_dir)
+    scores = []
+
+    def save_predictions(val_pred, val_target, test_pred, directory="."):
+        import numpy as np
+
+        val_pred = np.asarray(val_pred, dtype=np.float64).ravel()
+        val_target = np.asarray(val_target, dtype=np.float64).ravel()
+        scores.append(float(np.mean((val_pred - val_target) ** 2)))
+
+    scope = dict(_base_scope)
+    scope["save_predictions"] = save_predictions
+    out = io.StringIO()
+    exc_type = None
+    with contextlib.redirect_stdout(out), contextlib.redirect_stderr(out):
+        try:
+            exec(compile(_suffixes[i], "runfile.py", "exec"), scope)
+        except BaseException as e:
+            traceback.print_exc()
+            exc_type = type(e).__name__
+    output = out.getvalue()
+    metric = scores[-1] if scores else extract_metric(output)
+    return i, metric, output[-2000:], exc_type
+
+
+def _sweep_master(
+    prefix: str,
+    suffixes: list[str],
+    workers: int,
+    work_dir: str,
+    resources: ResourceProfile,
+    result_q,
+) -> None:
+    global _base_scope, _suffixes, _work_dir, _resources
+    import shutup
+
+    os.setpgrp()  # own process group, so that the variants can be killed as a whole on timeout
+
+    shutup.mute_warnings()
+    os.makedirs(work_dir, exist_ok=True)
+    os.chdir(work_dir)
+    _work_dir, _suffixes, _resources = os.getcwd(), suffixes, resources
+    # the shared stages run under the limits of the first slot
+    resources.apply(0)
+    resources.arm_cpu_limit()
+    _base_scope = {}
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            exec(compile(prefix, "runfile.py", "exec"), _base_scope)
+    except BaseException as e:
+        result_q.put(("error", f"{type(e).__name__}: {e}"))
+        return
+    # a fresh fork of the master per variant, so variants cannot see each other's changes to the
+    # data; the slots are handed out here, so a variant killed hard (OOM killer) cannot lose one
+    ctx = multiprocessing.get_context("fork")
+    pending = list(range(len(suffixes)))
+    free_slots = list(range(workers))
+    running = {}
+    while pending or running:
+        while pending and free_slots:
+            i, slot = pending.pop(0), free_slots.pop(0)
+            recv_conn, send_conn = ctx.Pipe(duplex=False)
+            process = ctx.Process(target=_run_variant, args=(i, slot, send_conn))
+            process.start()
+            send_conn.close()
+            running[process.sentinel] = (i, slot, process, recv_conn)
+        for sentinel in multiprocessing.connection.wait(list(running)):
+            i, slot, process, recv_conn = running.pop(sentinel)
+            process.join()
+            try:
+                result = recv_conn.recv()
+            except EOFError:  # died before sending its result
+                exc_type = exit_reason(process.exitcode)
+                output = f"{exc_type}: the variant exited with code {process.exitcode}"
+                result = (i, None, output, exc_type)
+            recv_conn.close()
+            free_slots.append(slot)
+            result_q.put(("result", result))
+    result_q.put(("done", None))
+
+
+def run_sweep(
+    variants: list[tuple[dict, str]],
+    workers: int | None = None,
+    timeout: float = 1800,
+    work_dir: str = "sweep",
+    resources: ResourceProfile | None = None,
+) -> list[SweepResult]:
+    """
+    Run the variants in forked processes and return their results (in the order of `variants`).
+    Every worker is pinned to its own cores with the limits of `resources`; without cpu_cores
+    in the profile, the cores are split evenly between the workers.
+    """
+    if not variants:
+        return []
+    resources = resources or ResourceProfile()
+    workers = min(workers or resources.n_slots, resources.n_slots)
+    if not resources.cpu_cores:
+        resources = replace(resources, cpu_cores=max(1, len(resources.available_cpus) // workers))
+    # stages before the first changed one are shared by all variants
+    cells = [split_cells(v_code) for _, v_code in variants]
+    n_shared = 0
+    while all(len(c) > n_shared + 1 for c in cells) and len({c[n_shared] for c in cells}) == 1:
+        n_shared += 1
+    prefix = "".join(cells[0][:n_shared])
+    suffixes = ["".join(c[n_shared:]) for c in cells]
+
+    ctx = multiprocessing.get_context("fork")
+    result_q = ctx.Queue()
+    master = ctx.Process(
+        target=_sweep_master,
+        args=(prefix, suffixes, workers, work_dir, resources, result_q),
+    )
+    master.start()
+    results: dict[int, tuple] = {}
+    error = None
+    deadline = time.monotonic() + timeout
+    try:
+        while len(results) < len(variants):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                error = "TimeoutError"
+                break
+            # checked before the get: a dead master has flushed everything it put
+            alive = master.is_alive()
+            try:
+                kind, payload = result_q.get(timeout=min(remaining, 1.0))
+            except queue.Empty:
+                if not alive:
+                    exc_type = exit_reason(master.exitcode)
+                    error = f"{exc_type}: the sweep master exited with code {master.exitcode}"
+                    break
+                continue
+            if kind == "result":
+                results[payload[0]] = payload
+            elif kind == "error":
+                error = payload
+                break
+            else:
+                break
+    finally:
+        master.join(timeout=1)
+        if master.is_alive():
+            with contextlib.suppress(ProcessLookupError):
+                os.killpg(master.pid, signal.SIGKILL)
+            master.join()
+
+    sweep_results = []
+    for i, (values, v_code) in enumerate(variants):
+        if i in results:
+            _, metric, output, exc_type = results[i]
+        else:
+            metric, output, exc_type = None, error or "", "SweepError"
+        sweep_results.append(SweepResult(values, v_code, metric, output, exc_type))
+    return sweep_results
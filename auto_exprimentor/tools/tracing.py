@@ -0,0 +1,100 @@
+# tracing.py
+
+import json
+import os
+import re
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from pathlib import Path
+
+
+class Tracer:
+    """
+    A lightweight tracer that records timed spans and counters.
+
+    Spans can be exported as a Chrome trace (open it in chrome://tracing or Perfetto)
+    and aggregated spans + counters as a Prometheus text-format file.
+    """
+
+    def __init__(self, max_events: int = 100_000):
+        self.max_events = max_events
+        self.events: list[dict] = []
+        self.span_seconds: dict[str, float] = defaultdict(float)
+        self.span_counts: dict[str, int] = defaultdict(int)
+        self.counters: dict[str, float] = defaultdict(float)
+        self._origin = time.perf_counter()
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def span(self, name: str, **args):
+        """
+        Time the enclosed block. The yielded dict holds the span arguments
+        and can be updated inside the block (e.g. once the node id is known).
+        """
+        start = time.perf_counter()
+        try:
+            yield args
+        finally:
+            self.record(name, start, time.perf_counter(), **args)
+
+    def record(self, name: str, start: float, end: float, **args) -> None:
+        """Record a span from two time.perf_counter() readings."""
+        with self._lock:
+            self.span_seconds[name] += end - start
+            self.span_counts[name] += 1
+            if len(self.events) < self.max_events:
+                self.events.append(
+                    {
+                        "name": name,
+                        "ph": "X",
+                        "ts": (start - self._origin) * 1e6,
+                        "dur": (end - start) * 1e6,
+                        "pid": os.getpid(),
+                        "tid": threading.get_ident(),
+                        "args": {k: str(v) for k, v in args.items()},
+                    }
+                )
+
+    def incr(self, name: str, value: float = 1) -> None:
+        """Increase a counter, e.g. LLM tokens, retries or cache hits."""
+        with self._lock:
+            self.counters[name] += value
+
+    def export_chrome_trace(self, path: str | Path) -> None:
+        """Write the recorded spans in the Chrome trace event format."""
+        with self._lock:
+            trace = {"traceEvents": list(self.events), "displayTimeUnit": "ms"}
+        _atomic_write(path, json.dumps(trace))
+
+    def export_prometheus(self, path: str | Path, prefix: str = "autoexp") -> None:
+        """Write span totals and counters in the Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            lines.append(f"# TYPE {prefix}_span_seconds summary")
+            for name in sorted(self.span_seconds):
+                label = f'{{span="{name}"}}'
+                lines.append(f"{prefix}_span_seconds_sum{label} {self.span_seconds[name]:.6f}")
+                lines.append(f"{prefix}_span_seconds_count{label} {self.span_counts[name]}")
+            for name in sorted(self.counters):
+                metric = f"{prefix}_{_metric_name(name)}_total"
+                lines.append(f"# TYPE {metric} counter")
+                lines.append(f"{metric} {self.counters[name]:g}")
+        _atomic_write(path, "\n".join(lines) + "\n")
+
+
+def _metric_name(name: str) -> str:
+    return re.sub(r"[^a-zA-Z0-9_]", "_", name)
+
+
+def _atomic_write(path: str | Path, content: str) -> None:
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, "w") as f:
+        f.write(content)
+    os.replace(tmp_path, path)
+
+
+tracer = Tracer()
@@ -0,0 +1,84 @@
+"""
+Import-time benchmark.
+
+Runs `python -X importtime -c "import <module>"` in fresh processes and reports the total import
+time and the slowest imports (cumulative), then the latency of spawning an interpreter child and
+running an empty snippet in it.
+
+    python bench_import.py [--module main] [--top 15] [--repeat 5]
+"""
+
+import argparse
+import importlib
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+IMPORTTIME_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$")
+
+
+def import_times(module: str) -> tuple[int, dict[str, int]]:
+    """Total import time of the module and the cumulative time of every imported module (µs)."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    cumulative = {}
+    for line in proc.stderr.splitlines():
+        m = IMPORTTIME_LINE.match(line)
+        if m:
+            cumulative[m.group(4)] = int(m.group(2))
+    return cumulative[module], cumulative
+
+
+def spawn_latency(module: str, repeat: int) -> list[float]:
+    # the children are forked from a parent which imported the module, as in a real run
+    sys.path.insert(0, os.getcwd())
+    importlib.import_module(module)
+    from auto_exprimentor.tools.interpreter import Interpreter
+
+    interpreter = Interpreter(working_dir=tempfile.mkdtemp())
+    latencies = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        interpreter.run("pass", reset_session=True)
+        latencies.append(time.perf_counter() - start)
+    interpreter.cleanup_session()
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--module", default="main")
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+
+    totals, cumulative = [], {}
+    for _ in range(args.repeat):
+        total, cumulative = import_times(args.module)
+        totals.append(total)
+    print(
+        f"import {args.module}: median {statistics.median(totals) / 1000:.1f} ms "
+        f"(min {min(totals) / 1000:.1f} ms, {len(cumulative)} modules)"
+    )
+    print("slowest imports (cumulative, last run):")
+    for name, us in sorted(cumulative.items(), key=lambda x: -x[1])[1 : args.top + 1]:
+        print(f"  {us / 1000:8.1f} ms  {name}")
+
+    latencies = spawn_latency(args.module, args.repeat)
+    print(
+        f"interpreter child spawn + run: median {statistics.median(latencies) * 1000:.1f} ms "
+        f"(min {min(latencies) * 1000:.1f} ms)"
+    )
+
+
+if __name__ == "__main__":
+    main()
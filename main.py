@@ -1,30 +1,77 @@
 from auto_exprimentor.config.config import cfg
 from auto_exprimentor.agent.agents import Agent
+from auto_exprimentor.agent.budget import SearchBudget
+from auto_exprimentor.agent.ensemble import run_ensemble
 from auto_exprimentor.journal.journals import Journal
+from auto_exprimentor.journal.store import SQLiteJournal
+from auto_exprimentor.journal.blobs import BlobStore
+from auto_exprimentor.journal.artifacts import ArtifactStore
 from auto_exprimentor.tools.interpreter import Interpreter
+from auto_exprimentor.tools.incremental import IncrementalRunner
+from auto_exprimentor.tools.resources import ResourceProfile
 from auto_exprimentor.journal.saver import save_run
+from auto_exprimentor.tools.tracing import tracer
+from auto_exprimentor.tools.chat import chat_factory
 import logging
 
 logging.basicConfig(level=logging.INFO)
 
 
+def export_traces(cfg):
+    trace_cfg = cfg.tracing
+    if trace_cfg.prometheus_file:
+        tracer.export_prometheus(cfg.code_save_dir / trace_cfg.prometheus_file)
+    if trace_cfg.chrome_trace_file:
+        tracer.export_chrome_trace(cfg.code_save_dir / trace_cfg.chrome_trace_file)
+
+
 def main():
 
-    def exec_callback(*args, **kwargs):
-        res = interpreter.run(*args, **kwargs)
+    def exec_callback(code, reset_session=True, lineage=None, **kwargs):
+        if lineage is not None:
+            return runner.run(code, lineage=lineage, **kwargs)
+        res = interpreter.run(code, reset_session, **kwargs)
         return res
 
-    interpreter = Interpreter()
-    journal = Journal()
-    agent = Agent(cfg=cfg, journal=journal)
+    chat_factory.configure(cfg.chat)
+    resources = ResourceProfile.from_config(cfg.resources)
+    interpreter = Interpreter(working_dir=cfg.work_dir, resources=resources)
+    runner = IncrementalRunner(
+        max_sessions=cfg.agent.incremental.max_sessions,
+        working_dir=cfg.work_dir,
+        resources=resources,
+    )
+    if cfg.journal_path:
+        journal = SQLiteJournal(cfg.journal_path)
+    else:
+        journal = Journal(blob_store=BlobStore(cfg.blob_dir) if cfg.blob_dir else None)
+    budget = SearchBudget.from_config(cfg.agent.budget)
+    artifacts = ArtifactStore(cfg.code_save_dir)
+    agent = Agent(
+        cfg=cfg, journal=journal, budget=budget, artifacts=artifacts, resources=resources
+    )
 
     step = len(journal)
-    while step < cfg.agent.steps:
+    while step < cfg.agent.steps and not budget.exhausted:
         agent.step(exec_callback=exec_callback)
-        save_run(cfg=cfg, journal=journal)
+        with tracer.span("save_run"):
+            save_run(cfg=cfg, journal=journal, artifacts=artifacts)
+        export_traces(cfg)
         step = step + 1
 
     interpreter.cleanup_session()
+    runner.cleanup()
+    journal.tree.export(cfg.code_save_dir / "tree.json")
+
+    if cfg.ensemble.enabled:
+        with tracer.span("ensemble"):
+            run_ensemble(
+                journal,
+                artifacts,
+                top_k=cfg.ensemble.top_k,
+                max_rounds=cfg.ensemble.max_rounds,
+            )
+        export_traces(cfg)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,192 @@
+"""
+Rate limiting and retries of ChatFactory against a local stub server.
+
+The stub backend is a real HTTP server which answers with scripted status codes, Retry-After
+headers and delays; the chat function talks to it over HTTP and raises errors shaped like the
+ones of the openai / zhipuai clients (status_code + response.headers).
+"""
+
+import json
+import threading
+import time
+import urllib.error
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+
+import pytest
+
+from auto_exprimentor.tools.chat import (
+    AIMDLimiter,
+    BackendLimits,
+    ChatFactory,
+    TokenBucket,
+    is_transient_error,
+    retry_after,
+)
+
+MESSAGES = [{"role": "user", "content": "hello"}]
+
+
+class StubAPIError(Exception):
+    def __init__(self, status_code: int, headers: dict):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+        self.response = SimpleNamespace(status_code=status_code, headers=headers)
+
+
+class StubServer:
+    """Answers POST requests with the scripted (status, headers, delay) responses, then with 200."""
+
+    def __init__(self):
+        self.script: list[tuple[int, dict, float]] = []
+        self.requests = 0
+        self.lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                self.rfile.read(int(self.headers["Content-Length"]))
+                with stub.lock:
+                    stub.requests += 1
+                    status, headers, delay = stub.script.pop(0) if stub.script else (200, {}, 0.0)
+                time.sleep(delay)
+                body = json.dumps(
+                    {
+                        "choices": [{"message": {"content": "ok"}}],
+                        "usage": {"prompt_tokens": 2, "completion_tokens": 1, "total_tokens": 3},
+                    }
+                ).encode()
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.httpd.server_port}/v1/chat/completions"
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+
+    def chat_func(self, model, messages, temperature):
+        data = json.dumps({"model": model, "messages": messages}).encode()
+        request = urllib.request.Request(
+            self.url, data=data, headers={"Content-Type": "application/json"}
+        )
+        try:
+            with urllib.request.urlopen(request, timeout=10) as response:
+                payload = json.load(response)
+        except urllib.error.HTTPError as e:
+            raise StubAPIError(e.code, {k.lower(): v for k, v in e.headers.items()}) from None
+        return SimpleNamespace(
+            choices=[
+                SimpleNamespace(message=SimpleNamespace(content=c["message"]["content"]))
+                for c in payload["choices"]
+            ],
+            usage=SimpleNamespace(**payload["usage"]),
+        )
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+@pytest.fixture
+def server():
+    stub = StubServer()
+    yield stub
+    stub.close()
+
+
+@pytest.fixture
+def factory(server):
+    factory = ChatFactory()
+    factory.model_base_to_chat_func = {"glm": server.chat_func}
+    factory.max_retries = 3
+    factory.backoff_base = 0.001
+    factory.backoff_max = 0.01
+    factory.backend_limits["glm"] = BackendLimits(
+        requests_per_minute=6000, tokens_per_minute=1_000_000, max_concurrency=4, latency_target=0.1
+    )
+    return factory
+
+
+def test_retries_429_honouring_retry_after(server, factory):
+    server.script = [(429, {"Retry-After": "0.3"}, 0.0)]
+    start = time.monotonic()
+    response = factory("glm-4-flash", MESSAGES)
+    assert response.choices[0].message.content == "ok"
+    assert server.requests == 2
+    assert time.monotonic() - start >= 0.3
+
+
+def test_fails_after_max_retries(server, factory):
+    server.script = [(503, {}, 0.0)] * 10
+    with pytest.raises(StubAPIError) as exc_info:
+        factory("glm-4-flash", MESSAGES, max_retries=2)
+    assert exc_info.value.status_code == 503
+    assert server.requests == 3
+
+
+def test_no_retry_on_bad_request(server, factory):
+    server.script = [(400, {}, 0.0)]
+    with pytest.raises(StubAPIError):
+        factory("glm-4-flash", MESSAGES)
+    assert server.requests == 1
+
+
+def test_on_attempt_reports_backend_latency_only(server, factory):
+    server.script = [(429, {"Retry-After": "0.3"}, 0.0)]
+    attempts = []
+    factory("glm-4-flash", MESSAGES, on_attempt=lambda latency, ok: attempts.append((latency, ok)))
+    assert [ok for _, ok in attempts] == [False, True]
+    # the Retry-After wait is not part of the latencies
+    assert all(latency < 0.3 for latency, _ in attempts)
+
+
+def test_slow_responses_halve_concurrency(server, factory):
+    server.script = [(200, {}, 0.2), (200, {}, 0.2)]
+    factory("glm-4-flash", MESSAGES)
+    assert factory.get_policy("glm").concurrency.limit == 2
+    factory("glm-4-flash", MESSAGES)
+    assert factory.get_policy("glm").concurrency.limit == 1
+    # fast responses do not lower it further
+    factory("glm-4-flash", MESSAGES)
+    assert factory.get_policy("glm").concurrency.limit == 1
+
+
+def test_aimd_limiter_increases_after_healthy_calls():
+    limiter = AIMDLimiter(initial=2, maximum=3, latency_target=1.0, increase_every=2)
+    for _ in range(4):
+        limiter.acquire()
+        limiter.release(0.01, ok=True)
+    assert limiter.limit == 3
+    limiter.acquire()
+    limiter.release(0.01, ok=False)
+    assert limiter.limit == 1.5
+
+
+def test_token_bucket_waits_for_refill():
+    bucket = TokenBucket(rate=10, capacity=1)
+    assert bucket.acquire() == 0
+    start = time.monotonic()
+    bucket.acquire()
+    assert time.monotonic() - start >= 0.08
+
+
+def test_is_transient_error():
+    assert is_transient_error(StubAPIError(429, {}))
+    assert is_transient_error(StubAPIError(502, {}))
+    assert is_transient_error(TimeoutError())
+    assert not is_transient_error(StubAPIError(400, {}))
+    assert not is_transient_error(ValueError("bad"))
+
+
+def test_retry_after():
+    assert retry_after(StubAPIError(429, {"retry-after": "2"})) == 2.0
+    assert retry_after(StubAPIError(429, {})) is None
+    assert retry_after(ValueError()) is None
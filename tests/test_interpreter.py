@@ -0,0 +1,116 @@
+"""
+Warm sessions of the interpreter: fork-based snapshots, restores and cleanup.
+
+Every test runs real child processes (and paused snapshot forks of them), so the process
+handling is exercised as in a run: pid handover on restore, /proc liveness checks of restored
+snapshots and process-group kills on cleanup.
+"""
+
+import os
+import time
+
+import pytest
+
+from auto_exprimentor.tools.incremental import IncrementalRunner
+from auto_exprimentor.tools.interpreter import Interpreter
+
+CODE = """# %% load data
+data = {"id": [1, 2], "x": [3, 4]}
+# %% features
+data.pop("id")
+features = sorted(data)
+# %% train
+print("features", features)
+"""
+
+
+def group_pids(pgid: int) -> list[int]:
+    """Live (non-zombie) processes of a process group."""
+    pids = []
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                fields = f.read().rsplit(")", 1)[1].split()
+        except OSError:
+            continue
+        # fields after the command: state, ppid, pgrp, ...
+        if fields[0] != "Z" and int(fields[2]) == pgid:
+            pids.append(int(entry))
+    return pids
+
+
+@pytest.fixture
+def runner(tmp_path):
+    runner = IncrementalRunner(working_dir=tmp_path, timeout=30)
+    yield runner
+    runner.cleanup()
+
+
+def test_restore_after_in_place_mutation(runner):
+    result = runner.run(CODE, lineage="a")
+    assert result.exc_type is None
+    assert "features ['x']" in "".join(result.term_out)
+
+    # the features stage changed: it must see the data as loaded, not as mutated by the first run
+    changed = CODE.replace("features = sorted(data)", 'features = sorted(data) + ["y"]')
+    result = runner.run(changed, lineage="a")
+    output = "".join(result.term_out)
+    assert result.exc_type is None, output
+    assert "features ['x', 'y']" in output
+    assert "1 unchanged stage(s) reused" in output
+    assert "2 of 3 stages executed" in output
+
+
+def test_timeout_in_restored_session(runner):
+    assert runner.run(CODE, lineage="a").exc_type is None
+
+    slow = CODE.replace('print("features", features)', "while True:\n    pass")
+    result = runner.run(slow, lineage="a", timeout=1)
+    assert result.exc_type == "TimeoutError"
+
+    # the interrupted session is still usable and restores the unchanged stages
+    result = runner.run(CODE, lineage="a")
+    output = "".join(result.term_out)
+    assert result.exc_type is None, output
+    assert "features ['x']" in output
+    assert "2 unchanged stage(s) reused" in output
+
+
+def test_traceback_line_numbers_of_the_whole_code(runner):
+    failing = CODE.replace('print("features", features)', 'raise ValueError("bad")')
+    result = runner.run(failing, lineage="a")
+    assert result.exc_type == "ValueError"
+    assert result.exc_stack[-1][:2] == ("runfile.py", 7)
+    assert "3 of 3 stages executed" in "".join(result.term_out)
+
+
+def test_cleanup_session_leaves_no_stray_pids(tmp_path):
+    interpreter = Interpreter(working_dir=tmp_path)
+    interpreter.run("x = 1")
+    interpreter.snapshot()
+    interpreter.run("x = 2", reset_session=False)
+    interpreter.snapshot()
+    interpreter.restore(0)
+    # the session is now run by a restored snapshot, which is not a child of this process
+    assert interpreter.active_pid != interpreter.process.pid
+    result = interpreter.run("print(x)", reset_session=False)
+    assert result.term_out[0] == "1"
+
+    pgid = interpreter.process.pid
+    assert len(group_pids(pgid)) >= 2
+    interpreter.cleanup_session()
+    deadline = time.monotonic() + 5
+    while group_pids(pgid) and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert group_pids(pgid) == []
+
+
+def test_child_death_is_reported(tmp_path):
+    interpreter = Interpreter(working_dir=tmp_path)
+    # (after a moment, so that the ready event is flushed before the child dies)
+    result = interpreter.run("import os, time\ntime.sleep(0.5)\nos._exit(3)")
+    assert result.exc_type == "ChildProcessDied"
+    assert interpreter.process is None
+    interpreter.cleanup_session()
@@ -0,0 +1,76 @@
+"""
+SQLiteJournal: the on-disk journal answers like the in-memory Journal.
+"""
+
+import random
+
+import pytest
+
+from auto_exprimentor.journal.journals import Journal
+from auto_exprimentor.journal.nodes import Node
+from auto_exprimentor.journal.store import SQLiteJournal, StoredNode
+
+
+def fill(journals, n: int = 60, seed: int = 0) -> None:
+    """Append the same random tree to every journal."""
+    rng = random.Random(seed)
+    ids = []
+    for i in range(n):
+        parent_id = rng.choice(ids) if ids and rng.random() < 0.8 else None
+        is_buggy = rng.random() < 0.3
+        metric = None if is_buggy else rng.choice([0.5, 1.0, 2.0, 4.0])
+        node_id = f"node{i}"
+        for journal in journals:
+            parent = journal.get_node(parent_id) if parent_id else None
+            node = Node(f"print({i})", plan=f"plan {i}", id=node_id, parent=parent)
+            node.is_buggy, node.metric = is_buggy, metric
+            journal.append(node)
+        ids.append(node_id)
+
+
+@pytest.fixture
+def journals(tmp_path):
+    memory, stored = Journal(), SQLiteJournal(tmp_path / "journal.sqlite")
+    fill([memory, stored])
+    yield memory, stored
+    stored.close()
+
+
+def ids(nodes) -> list[str]:
+    return [node.id for node in nodes]
+
+
+def test_queries_match_the_in_memory_journal(journals):
+    memory, stored = journals
+    assert len(stored) == len(memory)
+    assert ids(stored.nodes) == ids(memory.nodes)
+    assert ids(stored.draft_nodes) == ids(memory.draft_nodes)
+    assert ids(stored.buggy_leaf_nodes) == ids(memory.buggy_leaf_nodes)
+    assert ids(stored.good_nodes) == ids(memory.good_nodes)
+    assert stored.metric_history == memory.metric_history
+    assert ids(stored.top_k(10)) == ids(memory.top_k(10))
+    assert stored.best_node.id == memory.best_node.id == memory.get_best_node().id
+    assert stored.stage_counts() == memory.stage_counts()
+    assert stored.generate_summary() == memory.generate_summary()
+
+
+def test_nodes_load_lazily(journals):
+    memory, stored = journals
+    node = stored[-1]
+    assert isinstance(node, StoredNode)
+    assert "_code" not in node.__dict__
+    assert node.code == memory[-1].code
+    assert "_code" in node.__dict__
+    assert node.stage_name == memory[-1].stage_name
+    assert node.debug_depth == memory[-1].debug_depth
+    if node.parent is not None:
+        assert node.parent.id == memory[-1].parent.id
+
+
+def test_reopen_rebuilds_the_tree_index(journals, tmp_path):
+    memory, stored = journals
+    stored.close()
+    reopened = SQLiteJournal(tmp_path / "journal.sqlite")
+    assert reopened.tree.to_adjacency() == memory.tree.to_adjacency()
+    assert reopened.best_node.id == memory.best_node.id
+    reopened.close()
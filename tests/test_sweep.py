@@ -0,0 +1,75 @@
+"""
+Hyperparameter sweeps: tunable detection and variant runs in forked processes.
+"""
+
+import time
+
+from auto_exprimentor.tools.sweep import apply_values, find_tunables, make_variants, run_sweep
+
+CODE = """# %% load data
+import os, signal
+data = [1.0, 2.0, 3.0]
+# %% train
+scale = {scale}
+{body}
+print("MSE", sum(data) * scale)
+"""
+
+
+def variants(bodies: dict[int, str]) -> list[tuple[dict, str]]:
+    return [
+        ({"scale": scale}, CODE.format(scale=scale, body=body)) for scale, body in bodies.items()
+    ]
+
+
+def test_find_tunables_keywords_and_markers():
+    code = "model = Model(learning_rate=0.1, verbose=1)\nwidth = 64  # tune\ndepth = 3\n"
+    tunables = find_tunables(code)
+    assert [(t.name, t.value) for t in tunables] == [("learning_rate", 0.1), ("width", 64)]
+    assert apply_values(code, tunables, [0.05, 32]).splitlines()[:2] == [
+        "model = Model(learning_rate=0.05, verbose=1)",
+        "width = 32  # tune",
+    ]
+
+
+def test_make_variants_are_distinct():
+    code = "lr = 0.1\nn_estimators = 100\n"
+    made = make_variants(code, find_tunables(code), 5)
+    assert len(made) == 5
+    assert len({v_code for _, v_code in made}) == 5
+    assert code not in [v_code for _, v_code in made]
+
+
+def test_variants_do_not_share_changes_to_the_data(tmp_path):
+    # every variant mutates the shared data, but none sees the changes of the others
+    mutating = variants({1: "data.append(100.0)", 2: "data.append(100.0)"})
+    results = run_sweep(mutating, workers=1, work_dir=tmp_path)
+    assert [r.metric for r in results] == [106.0, 212.0]
+
+
+def test_killed_variants_do_not_stall_the_sweep(tmp_path):
+    kill = "os.kill(os.getpid(), signal.SIGKILL)"
+    start = time.monotonic()
+    results = run_sweep(
+        variants({1: kill, 2: kill, 3: "pass", 4: "pass"}), workers=1, timeout=60, work_dir=tmp_path
+    )
+    assert time.monotonic() - start < 30
+    assert [r.exc_type for r in results] == ["OutOfMemoryError", "OutOfMemoryError", None, None]
+    assert [r.metric for r in results] == [None, None, 18.0, 24.0]
+
+
+def test_timeout(tmp_path):
+    looping = variants({1: "while True:\n    pass"})
+    results = run_sweep(looping, workers=1, timeout=1, work_dir=tmp_path)
+    assert results[0].exc_type == "SweepError"
+    assert results[0].output == "TimeoutError"
+
+
+def test_failing_shared_stage(tmp_path):
+    bodies = {1: "pass", 2: "pass"}
+    broken = [
+        (values, v_code.replace("data = [", "data = undefined + ["))
+        for values, v_code in variants(bodies)
+    ]
+    results = run_sweep(broken, workers=1, work_dir=tmp_path)
+    assert all(r.exc_type == "SweepError" and "NameError" in r.output for r in results)
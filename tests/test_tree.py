@@ -0,0 +1,84 @@
+"""
+The tree index of the journals, checked against walks over the nodes themselves.
+"""
+
+import random
+
+import pytest
+
+from auto_exprimentor.journal.journals import Journal
+from auto_exprimentor.journal.nodes import Node
+from auto_exprimentor.journal.tree import TreeIndex
+
+
+def random_journal(n: int = 80, seed: int = 0) -> tuple[Journal, list[Node]]:
+    rng = random.Random(seed)
+    journal, nodes = Journal(), []
+    for _ in range(n):
+        parent = rng.choice(nodes) if nodes and rng.random() < 0.8 else None
+        node = Node("pass", parent=parent)
+        node.is_buggy = rng.random() < 0.3
+        # few distinct metrics, so that there are ties
+        node.metric = None if node.is_buggy else rng.choice([0.5, 1.0, 2.0, 4.0])
+        journal.append(node)
+        nodes.append(node)
+    return journal, nodes
+
+
+def subtree(node: Node) -> list[Node]:
+    nodes, stack = [], [node]
+    while stack:
+        nodes.append(stack.pop())
+        stack.extend(nodes[-1].children)
+    return nodes
+
+
+def test_matches_the_nodes():
+    journal, nodes = random_journal()
+    tree = journal.tree
+    for node in nodes:
+        path = tree.path_to_root(node.id)
+        assert path[-1] == tree.root_id(node.id)
+        assert tree.depth[node.id] == len(path) - 1
+        assert tree.stage[node.id] == node.stage_name
+        assert tree.debug_depth[node.id] == node.debug_depth
+        assert tree.subtree_size[node.id] == len(subtree(node))
+        good = [n.metric for n in subtree(node) if not n.is_buggy]
+        if node.is_buggy or not good:
+            assert tree.lineage_improvement(node.id) is None
+        else:
+            assert tree.lineage_improvement(node.id) == node.metric - min(good)
+    assert journal.stage_counts() == {
+        stage: sum(node.stage_name == stage for node in nodes)
+        for stage in ("draft", "debug", "improve")
+    }
+    assert tree.roots() == [node.id for node in nodes if node.parent is None]
+
+
+def test_best_node_breaks_ties_by_insertion_order():
+    journal, _ = random_journal()
+    assert journal.best_node is journal.get_best_node()
+    assert journal.best_node is journal.top_k(1)[0]
+
+
+def test_buggy_leaf_nodes():
+    journal, nodes = random_journal()
+    assert journal.buggy_leaf_nodes == [n for n in nodes if n.is_buggy and not n.children]
+
+
+def test_adjacency_export(tmp_path):
+    journal, nodes = random_journal(n=10)
+    adjacency = journal.tree.to_adjacency()
+    assert adjacency["id"] == [node.id for node in nodes]
+    for node, parent in zip(nodes, adjacency["parent"]):
+        assert parent == (nodes.index(node.parent) if node.parent else -1)
+    journal.tree.export(tmp_path / "tree.json")
+    assert (tmp_path / "tree.json").exists()
+
+
+@pytest.mark.parametrize("metric", [None, "nan-like", float("inf")])
+def test_unusable_metrics_are_not_best(metric):
+    tree = TreeIndex()
+    tree.add("a", None, 1.0, False)
+    tree.add("b", "a", metric, False)
+    assert tree.best_id == "a"